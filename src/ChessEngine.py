@@ -1,15 +1,116 @@
+'''
+The position is kept as bitboards: one 64 bit integer per piece (colour + type) plus
+occupancy masks for each colour. Square (row, col) is bit row*8 + col, so row 0 (rank 8)
+is bits 0-7 and h1 is bit 63
+
+Pieces are numbered by their index in pieceNames (white 0-5, black 6-11, EMPTY for no piece)
+and the move generators work with moves packed into one int:
+    bits  0-5   start square
+    bits  6-11  end square
+    bits 12-14  promotion piece type (1 knight, 2 bishop, 3 rook, 4 queen, 0 for none)
+    bit  15     en passant capture
+    bit  16     2 square pawn advance
+    bits 18-21  piece moved
+    bits 22-25  piece captured (EMPTY for none)
+The Move class wraps a packed move with the old attributes for the UI
+
+makeMove pushes what a move destroys onto a preallocated per ply stack and undo pops it, so any
+number of makeMove/undo pairs restore the position exactly without copying or allocating:
+    keyStack[ply]    zobrist key before the move
+    stateStack[ply]  bits 0-3 piece captured, bits 4-10 en passant square (64 for none),
+                     bits 11-14 castling rights, bits 15 and up halfmove clock
+'''
+import random
+from array import array
+
+from evaluationTables import pieceScores, piecePositionScores, endgamePositionScores, phaseWeights
+from attackTables import (directions, rookDirections, bishopDirections, rays, rayIsPositive, between, line,
+                          knightAttacks, kingAttacks, pawnAttacks, rowMasks, fileMasks,
+                          rookAttacks, bishopAttacks)
+
+pieceNames = ('wp','wN','wB','wR','wQ','wK','bp','bN','bB','bR','bQ','bK')
+pieceIndex = {piece: i for i, piece in enumerate(pieceNames)}
+WP, WN, WB, WR, WQ, WK, BP, BN, BB, BR, BQ, BK = range(12)
+EMPTY = 12
+squareNames = pieceNames + ('--',) #piece string for each piece number, EMPTY is '--'
+
+PROMOTION_SHIFT = 12
+FLAG_ENPASSANT = 1 << 15
+FLAG_DOUBLE_PUSH = 1 << 16
+PIECE_SHIFT = 18
+CAPTURED_SHIFT = 22
+promotionPieces = (4, 3, 2, 1) #queen first, so a move picked by its squares alone promotes to a queen
+promotionLetters = ('', 'n', 'b', 'r', 'q')
+
+NO_SQUARE = 64
+enpassantSquares = [(sq >> 3, sq & 7) for sq in range(64)] + [()] #enpassantPossible of each stacked square
+STACK_SIZE = 256 #plies the state stacks start with, they double when a game gets longer
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+castlingLetters = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+#castling rights that survive a move from or to each square: king and rook moves, and rooks being taken
+castlingMasks = [15]*64
+castlingMasks[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE) #e1
+castlingMasks[63] = 15 & ~WHITE_KINGSIDE #h1
+castlingMasks[56] = 15 & ~WHITE_QUEENSIDE #a1
+castlingMasks[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE) #e8
+castlingMasks[7] = 15 & ~BLACK_KINGSIDE #h8
+castlingMasks[0] = 15 & ~BLACK_QUEENSIDE #a8
+
+'''
+Pack a move, pieces are piece numbers and promotion a piece type (0 for none)
+'''
+def packMove(start, end, piece, captured=EMPTY, promotion=0, flags=0):
+    return start | end << 6 | promotion << PROMOTION_SHIFT | flags | piece << PIECE_SHIFT | captured << CAPTURED_SHIFT
+
+'''
+Coordinate notation of a packed move, e.g. e2e4 or e7e8q
+'''
+def moveNotation(move):
+    start = move & 63
+    end = (move >> 6) & 63
+    return (Move.colsToFiles[start & 7] + Move.rowsToRanks[start >> 3] +
+            Move.colsToFiles[end & 7] + Move.rowsToRanks[end >> 3] +
+            promotionLetters[(move >> PROMOTION_SHIFT) & 7])
+
+startingBoard = [
+    ['bR','bN','bB','bQ','bK','bB','bN','bR'],
+    ['bp','bp','bp','bp','bp','bp','bp','bp'],
+    ['--','--','--','--','--','--','--','--'],
+    ['--','--','--','--','--','--','--','--'],
+    ['--','--','--','--','--','--','--','--'],
+    ['--','--','--','--','--','--','--','--'],
+    ['wp','wp','wp','wp','wp','wp','wp','wp'],
+    ['wR','wN','wB','wQ','wK','wB','wN','wR']
+]
+
+'''
+Material plus piece square table score of each piece number on each square, from its own side's
+point of view (black pieces read the tables with the row flipped), for the middlegame and the endgame
+'''
+middlegameSquareScores = [[pieceScores[name[1]] + piecePositionScores[name[1]][sq if name[0] == 'w' else sq ^ 56]
+                           for sq in range(64)] for name in pieceNames]
+endgameSquareScores = [[pieceScores[name[1]] + endgamePositionScores[name[1]][sq if name[0] == 'w' else sq ^ 56]
+                        for sq in range(64)] for name in pieceNames]
+piecePhases = [phaseWeights[name[1]] for name in pieceNames]
+
+'''
+Zobrist keys: the position key is the xor of one random 64 bit number per (piece, square),
+one for black to move and one for the file of the en passant square. A fixed seed keeps
+keys the same between runs and processes
+'''
+_zobristRandom = random.Random(0x5EED)
+zobristPieces = [[_zobristRandom.getrandbits(64) for _ in range(64)] for piece in pieceNames]
+zobristBlackToMove = _zobristRandom.getrandbits(64)
+zobristEnpassant = [_zobristRandom.getrandbits(64) for _ in range(8)]
+
+
 class GameState():
-    def __init__(self):
-        self.board = [
-            ['bR','bN','bB','bQ','bK','bB','bN','bR'],
-            ['bp','bp','bp','bp','bp','bp','bp','bp'],
-            ['--','--','--','--','--','--','--','--'],
-            ['--','--','--','--','--','--','--','--'],
-            ['--','--','--','--','--','--','--','--'],
-            ['--','--','--','--','--','--','--','--'],
-            ['wp','wp','wp','wp','wp','wp','wp','wp'],
-            ['wR','wN','wB','wK','wQ','wB','wN','wR']
-        ]
+    def __init__(self, fen=None):
+        self.bitboards = [0]*12 #one bitboard per piece number
+        self.colorBoards = [0, 0] #occupancy of white and of black
+        self.occupied = 0 #occupancy of both sides
+        self.squares = [EMPTY]*64 #piece number on each bit number, to look up what a move captures
+        self._board = None #8x8 list view, only built when someone asks for self.board
         self.whiteToMove = True
         self.checkmate = False
         self.stalemate = False
@@ -18,40 +119,254 @@ class GameState():
         self.checks = []
         self.whiteKingLocation = (7,4)
         self.blackKingLocation = (0,4)
-        self.movelog = []
+        self.movelog = [] #packed moves
         self.enpassantPossible = () #coordinates for the squares where an en passant capture is possible
-        self.moveFunctions = {  'p':self.getPawnMoves,'R':self.getRookMoves,'N':self.getKnightMoves,
-                                'B':self.getBishopMoves,'K':self.getKingMoves,'Q':self.getQueenMoves    }
+        self.castlingRights = 15 #WHITE_KINGSIDE | ..., tracked for the FEN although castling isn't generated
+        self.halfmoveClock = 0 #plies since the last pawn move or capture
+        self.keyStack = array('Q', bytes(8 * STACK_SIZE)) #what makeMove can't undo by itself, one entry per
+        self.stateStack = array('Q', bytes(8 * STACK_SIZE)) #move in movelog (see the top of the file)
+        self.zobristKey = 0 #hash of the position, kept up to date by makeMove and undo
+        self.middlegameScores = [0, 0] #material plus piece square tables of white and of black, kept up to date
+        self.endgameScores = [0, 0] #by makeMove and undo like the zobrist key
+        self.phase = 0 #phase weights of the pieces on the board (evaluationTables.PHASE_TOTAL at the start)
+        self.startFullmoveNumber = 1 #FEN move number of the position before movelog[0]
+        self.attackMap = 0 #squares the side not to move attacks, set by generateLegalMoves
+        self.targetMask = -1 #squares generated moves may land on, narrowed while generating one stage of moves
+        self.moveCache = None #optional moveCache.MoveCache, remembers legal moves, checks and pins by zobrist key
+        self.board = startingBoard
+        if fen is not None:
+            self.loadFen(fen)
+
+    '''
+    8x8 list of piece strings ('wp', '--', ...) built the first time it is asked for after a move,
+    callers should treat it as read only
+    '''
+    @property
+    def board(self):
+        if self._board is None:
+            squares = self.squares
+            self._board = [[squareNames[p] for p in squares[i:i+8]] for i in range(0, 64, 8)]
+        return self._board
+
+    '''
+    Assigning an 8x8 list replaces the whole position
+    '''
+    @board.setter
+    def board(self, board):
+        self.bitboards = [0]*12
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece != '--':
+                    self.squares[r*8 + c] = pieceIndex[piece]
+                    self.bitboards[pieceIndex[piece]] |= 1 << (r*8 + c)
+                    if piece == 'wK':
+                        self.whiteKingLocation = (r,c)
+                    elif piece == 'bK':
+                        self.blackKingLocation = (r,c)
+                else:
+                    self.squares[r*8 + c] = EMPTY
+        self.updateOccupancy()
+        self.zobristKey = self.computeZobristKey()
+        self.middlegameScores, self.endgameScores, self.phase = self.computeEvaluationTerms()
+
+    '''
+    Independent copy of the position and its move history, e.g. for a search running beside the UI
+    '''
+    def copy(self):
+        gs = GameState.__new__(GameState)
+        gs.__dict__.update(self.__dict__)
+        gs.bitboards = self.bitboards[:]
+        gs.colorBoards = self.colorBoards[:]
+        gs.squares = self.squares[:]
+        gs._board = None
+        gs.movelog = self.movelog[:]
+        gs.middlegameScores = self.middlegameScores[:]
+        gs.endgameScores = self.endgameScores[:]
+        gs.keyStack = array('Q', self.keyStack)
+        gs.stateStack = array('Q', self.stateStack)
+        gs.moveCache = None #a cache is for one GameState (and thread) only
+        return gs
+
+    def updateOccupancy(self):
+        bbs = self.bitboards
+        self.colorBoards[0] = bbs[WP] | bbs[WN] | bbs[WB] | bbs[WR] | bbs[WQ] | bbs[WK]
+        self.colorBoards[1] = bbs[BP] | bbs[BN] | bbs[BB] | bbs[BR] | bbs[BQ] | bbs[BK]
+        self.occupied = self.colorBoards[0] | self.colorBoards[1]
+        self._board = None
+
+    '''
+    Set up the position from a FEN string, e.g. the perft reference positions
+    (the castling rights are kept but not used yet since castling isn't generated)
+    '''
+    def loadFen(self, fen):
+        fields = fen.split()
+        board = [['--']*8 for _ in range(8)]
+        for r, rank in enumerate(fields[0].split('/')):
+            c = 0
+            for ch in rank:
+                if ch.isdigit(): #run of empty squares
+                    c += int(ch)
+                else:
+                    board[r][c] = ('w' if ch.isupper() else 'b') + (ch.upper() if ch.lower() != 'p' else 'p')
+                    c += 1
+        self.board = board
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        self.enpassantPossible = ()
+        if len(fields) > 3 and fields[3] != '-':
+            self.enpassantPossible = (Move.ranksToRows[fields[3][1]], Move.filesToCol[fields[3][0]])
+        self.castlingRights = 0
+        if len(fields) > 2:
+            for letter, right in castlingLetters:
+                if letter in fields[2]:
+                    self.castlingRights |= right
+        self.movelog = []
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.startFullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.checkmate = False
+        self.stalemate = False
+        self.zobristKey = self.computeZobristKey()
 
     '''
-    Takes a move as a parameter and executes it (this will not work for castling , pawn promotion and en-passant)
+    FEN string of the position
+    '''
+    def getFen(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            ranks.append(rank + (str(empty) if empty else ''))
+        enpassant = '-'
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        castling = ''.join(letter for letter, right in castlingLetters if self.castlingRights & right) or '-'
+        startedWhite = self.whiteToMove == (len(self.movelog) % 2 == 0)
+        fullmoveNumber = self.startFullmoveNumber + (len(self.movelog) + (0 if startedWhite else 1)) // 2
+        return (f"{'/'.join(ranks)} {'w' if self.whiteToMove else 'b'} {castling} {enpassant} "
+                f"{self.halfmoveClock} {fullmoveNumber}")
+
+    '''
+    Hash the whole position from scratch, makeMove and undo keep self.zobristKey equal to this
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for piece, bb in enumerate(self.bitboards):
+            keys = zobristPieces[piece]
+            while bb:
+                low = bb & -bb
+                key ^= keys[low.bit_length() - 1]
+                bb ^= low
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        if self.enpassantPossible != ():
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        return key
+
+    '''
+    (middlegame scores, endgame scores, phase) of the position from scratch, makeMove and undo keep the
+    evaluation terms equal to this
+    '''
+    def computeEvaluationTerms(self):
+        middlegame = [0, 0]
+        endgame = [0, 0]
+        phase = 0
+        for piece, bb in enumerate(self.bitboards):
+            color = 0 if piece < 6 else 1
+            while bb:
+                low = bb & -bb
+                sq = low.bit_length() - 1
+                middlegame[color] += middlegameSquareScores[piece][sq]
+                endgame[color] += endgameSquareScores[piece][sq]
+                phase += piecePhases[piece]
+                bb ^= low
+        return middlegame, endgame, phase
+
+    '''
+    Takes a move (packed, or a Move from the UI) as a parameter and executes it (this will not work for castling)
     ''' 
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = '--'
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        if move.__class__ is Move:
+            move = move.packed
+        bbs = self.bitboards
+        squares = self.squares
+        start = move & 63
+        end = (move >> 6) & 63
+        piece = (move >> PIECE_SHIFT) & 15
+        captured = (move >> CAPTURED_SHIFT) & 15
+        color = 0 if piece < 6 else 1
+        #push the state the move can't give back
+        ply = len(self.movelog)
+        if ply == len(self.stateStack):
+            self.keyStack.frombytes(bytes(8 * ply))
+            self.stateStack.frombytes(bytes(8 * ply))
+        enpassant = self.enpassantPossible
+        self.keyStack[ply] = self.zobristKey
+        self.stateStack[ply] = (captured | (enpassant[0]*8 + enpassant[1] if enpassant else NO_SQUARE) << 4 |
+                                self.castlingRights << 11 | self.halfmoveClock << 15)
+        self.castlingRights &= castlingMasks[start] & castlingMasks[end]
+        if captured != EMPTY or piece == WP or piece == BP:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        pieceKeys = zobristPieces[piece]
+        key = self.zobristKey ^ zobristBlackToMove ^ pieceKeys[start]
+        middlegame = self.middlegameScores
+        endgame = self.endgameScores
+        if captured != EMPTY:
+            if move & FLAG_ENPASSANT:
+                capturedSq = (start & ~7) | (end & 7) #the captured pawn is beside the moving pawn
+                squares[capturedSq] = EMPTY
+            else:
+                capturedSq = end
+            bbs[captured] ^= 1 << capturedSq
+            self.colorBoards[1 - color] ^= 1 << capturedSq
+            key ^= zobristPieces[captured][capturedSq]
+            middlegame[1 - color] -= middlegameSquareScores[captured][capturedSq]
+            endgame[1 - color] -= endgameSquareScores[captured][capturedSq]
+            self.phase -= piecePhases[captured]
+        bbs[piece] ^= 1 << start
+        squares[start] = EMPTY
+        middlegame[color] -= middlegameSquareScores[piece][start]
+        endgame[color] -= endgameSquareScores[piece][start]
+        #pawn promotion
+        promotion = (move >> PROMOTION_SHIFT) & 7
+        if promotion:
+            piece = promotion + 6*color
+            pieceKeys = zobristPieces[piece]
+            self.phase += piecePhases[piece]
+        middlegame[color] += middlegameSquareScores[piece][end]
+        endgame[color] += endgameSquareScores[piece][end]
+        bbs[piece] |= 1 << end
+        squares[end] = piece
+        key ^= pieceKeys[end]
+        self.colorBoards[color] ^= (1 << start) | (1 << end)
+        self.occupied = self.colorBoards[0] | self.colorBoards[1]
+        self._board = None
         self.movelog.append(move) #log the move so we can undo it later
         self.whiteToMove = not self.whiteToMove # swap players
         #update king's location
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        if move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
-
-        #pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+        if piece == WK:
+            self.whiteKingLocation = (end >> 3, end & 7)
+        elif piece == BK:
+            self.blackKingLocation = (end >> 3, end & 7)
 
         #If pawn moves twice , the next move can capture enpassant
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2: #only on 2 square pawn advances
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.endCol)
+        if enpassant != ():
+            key ^= zobristEnpassant[enpassant[1]]
+        if move & FLAG_DOUBLE_PUSH: #only on 2 square pawn advances
+            self.enpassantPossible = ((start >> 3) + (end >> 3)) // 2, end & 7
+            key ^= zobristEnpassant[end & 7]
         else:
             self.enpassantPossible = ()
-        #if enpassant move must update the board to capture the pawn
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = '--' #capturing the pawn
-        
-        
-
+        self.zobristKey = key
 
     '''
     Undo last move
@@ -59,22 +374,49 @@ class GameState():
     def undo(self):
         if len(self.movelog)!=0: #make sure there is move to undo
             move = self.movelog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            ply = len(self.movelog)
+            state = self.stateStack[ply]
+            bbs = self.bitboards
+            squares = self.squares
+            start = move & 63
+            end = (move >> 6) & 63
+            piece = (move >> PIECE_SHIFT) & 15
+            captured = state & 15
+            color = 0 if piece < 6 else 1
+            promotion = (move >> PROMOTION_SHIFT) & 7
+            landed = promotion + 6*color if promotion else piece #what is standing on the end square
+            bbs[landed] ^= 1 << end
+            bbs[piece] |= 1 << start
+            squares[start] = piece
+            squares[end] = EMPTY
+            self.colorBoards[color] ^= (1 << start) | (1 << end)
+            middlegame = self.middlegameScores
+            endgame = self.endgameScores
+            middlegame[color] += middlegameSquareScores[piece][start] - middlegameSquareScores[landed][end]
+            endgame[color] += endgameSquareScores[piece][start] - endgameSquareScores[landed][end]
+            self.phase -= piecePhases[landed] - piecePhases[piece]
+            if captured != EMPTY:
+                #undo en passant move, the captured pawn goes back beside the landing square
+                capturedSq = (start & ~7) | (end & 7) if move & FLAG_ENPASSANT else end
+                bbs[captured] |= 1 << capturedSq
+                squares[capturedSq] = captured
+                self.colorBoards[1 - color] |= 1 << capturedSq
+                middlegame[1 - color] += middlegameSquareScores[captured][capturedSq]
+                endgame[1 - color] += endgameSquareScores[captured][capturedSq]
+                self.phase += piecePhases[captured]
+            self.occupied = self.colorBoards[0] | self.colorBoards[1]
+            self._board = None
             self.whiteToMove = not self.whiteToMove # switch characters back
             #update king's location
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            if move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
-            #undo en passant move
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = '--' #leave landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
-            #undo 2 square pawn advanced
-            if move.pieceMoved[1] == 'p' and abs(move.startRow-move.endRow) == 2:
-                self.enpassantPossible = ()
+            if piece == WK:
+                self.whiteKingLocation = (start >> 3, start & 7)
+            elif piece == BK:
+                self.blackKingLocation = (start >> 3, start & 7)
+            #pop what the move couldn't give back (this also undoes 2 square pawn advances)
+            self.zobristKey = self.keyStack[ply]
+            self.enpassantPossible = enpassantSquares[(state >> 4) & 127]
+            self.castlingRights = (state >> 11) & 15
+            self.halfmoveClock = state >> 15
             
 
 
@@ -131,313 +473,477 @@ class GameState():
                     
     '''
 
+
     #Advanced algorithm
 
+    '''
+    Legal moves as Move objects, for the UI, also sets checkmate and stalemate
+    '''
     def getValidMoves(self):
-        moves = []
+        moves = self.generateLegalMoves()
+        self.checkmate = not moves and self.inCheck
+        self.stalemate = not moves and not self.inCheck
+        return [Move.fromPacked(move) for move in moves]
+
+    '''
+    How many times the position was on the board before. Only positions with the same side to move
+    since the last pawn move or capture can be the same, so the key stack is scanned back that far
+    '''
+    def repetitions(self):
+        keys = self.keyStack
+        key = self.zobristKey
+        ply = len(self.movelog)
+        count = 0
+        for i in range(ply - 4, max(ply - self.halfmoveClock, 0) - 1, -2):
+            if keys[i] == key:
+                count += 1
+        return count
+
+    '''
+    'fifty-move rule' or 'threefold repetition' when either draws the game, None otherwise
+    (a checkmate on the move that reaches fifty moves still counts, check for legal moves first)
+    '''
+    def drawReason(self):
+        if self.halfmoveClock >= 100:
+            return 'fifty-move rule'
+        if self.halfmoveClock >= 8 and self.repetitions() >= 2:
+            return 'threefold repetition'
+        return None
+
+    '''
+    Legal moves as packed ints, the list passed in is cleared and reused so the search can keep one per ply
+    '''
+    def generateLegalMoves(self, moves=None):
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        cache = self.moveCache
+        if cache is not None:
+            entry = cache.get(self.zobristKey, True)
+            if entry is not None:
+                self.attackMap, self.inCheck, self.pins, self.checks, cached = entry
+                moves.extend(cached)
+                return moves
+        self.computePinsAndChecks()
+        self.addLegalMoves(moves)
+        if cache is not None:
+            cache.put(self.zobristKey, [self.attackMap, self.inCheck, self.pins, self.checks, tuple(moves)])
+        return moves
+
+    '''
+    Attack map, checks and pins of the position, everything addLegalMoves needs
+    '''
+    def updatePinsAndChecks(self):
+        cache = self.moveCache
+        if cache is not None:
+            entry = cache.get(self.zobristKey)
+            if entry is not None:
+                self.attackMap, self.inCheck, self.pins, self.checks, _ = entry
+                return
+            self.computePinsAndChecks()
+            cache.put(self.zobristKey, [self.attackMap, self.inCheck, self.pins, self.checks, None])
+        else:
+            self.computePinsAndChecks()
+
+    def computePinsAndChecks(self):
+        self.attackMap = self.attackedSquares(not self.whiteToMove)
         self.inCheck , self.pins, self.checks = self.checkForPinsAndChecks()
+
+    '''
+    Add the legal moves of the pieces standing on fromMask that land on targetMask (en passant counts as
+    landing on the captured pawn's square) to moves, after updatePinsAndChecks has been called for the position
+    '''
+    def addLegalMoves(self, moves, fromMask=-1, targetMask=-1):
         if self.whiteToMove:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
+            king = WK
         else:
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
+            king = BK
+        self.targetMask = targetMask
         if self.inCheck:
             if len(self.checks) == 1: #only one check, block check or move king
-                moves = self.getAllPossibleMoves()
+                first = len(moves)
+                self.getAllPossibleMoves(moves, fromMask)
                 #to block a check you must move a piece into one of the squares between the enemy piece and the king
                 check = self.checks[0] #check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking =  self.board[checkRow][checkCol] #enemy piece causing the check
-                validSquares = [] #squares that pieces can move to
-                #if knight, must captures the knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1,8):
-                        validSquare = (kingRow + check[2]*i, kingCol + check[3]*i) #check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: #once you to get to piece and checks
-                            break
+                checkSq = check[0]*8 + check[1]
+                #if knight (or pawn), must captures the piece or move king, there are no squares between to block
+                validSquares = between[kingRow*8 + kingCol][checkSq] | 1 << checkSq #bitmask of squares that pieces can move to
 
                 #get rid of any moves that don't block check or move king
-                for i in range(len(moves)-1,-1,-1): #Go through backwards when you are removing from the list
-                    if moves[i].pieceMoved[1] != 'K': #move doesn't move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: #move doesn't block the check or capture the piece
-                            moves.remove(moves[i])
-            else: #double check, king has to move
+                legalMoves = []
+                for move in moves[first:]:
+                    if (move >> PIECE_SHIFT) & 15 == king or (validSquares >> ((move >> 6) & 63)) & 1:
+                        legalMoves.append(move)
+                    elif move & FLAG_ENPASSANT and ((move & 56) | ((move >> 6) & 7)) == checkSq: #en passant taking the checking pawn
+                        legalMoves.append(move)
+                moves[first:] = legalMoves
+            elif (fromMask >> (kingRow*8 + kingCol)) & 1: #double check, king has to move
                 self.getKingMoves(kingRow, kingCol, moves)
         else: #not in check so all moves are valid
-            moves = self.getAllPossibleMoves()
-    
-
+            self.getAllPossibleMoves(moves, fromMask)
+        self.targetMask = -1
         return moves
 
+    '''
+    Legal moves handed out one stage at a time: the hash move (a from | to << 6 | promotion << 12 key,
+    0 for none) if it is legal, then captures, then promotions, then quiet moves. A stage is only
+    generated once the moves before it have been taken, so a consumer that stops early (a beta cutoff)
+    never pays for the rest. Pins and checks are worked out before this returns, so gs.inCheck can be
+    read straight away, and makeMove/undo between moves is fine.
+    sortCaptures / sortQuiets (optional) put the captures / the quiet moves in search order in place.
+    With noisyOnly, when not in check the quiet moves are only generated if there were no captures or
+    promotions (so the consumer can still tell a stalemate)
+    '''
+    def generateStagedMoves(self, hashMove=0, sortCaptures=None, sortQuiets=None, noisyOnly=False):
+        self.updatePinsAndChecks()
+        return self.stagedMoves(hashMove, (self.attackMap, self.inCheck, self.pins, self.checks), sortCaptures, sortQuiets, noisyOnly)
+
+    def stagedMoves(self, hashMove, state, sortCaptures, sortQuiets, noisyOnly):
+        moves = []
+        hashFound = False
+        noisyFound = False
+        if hashMove:
+            start = hashMove & 63
+            piece = self.squares[start]
+            if piece != EMPTY and (piece < 6) == self.whiteToMove:
+                end = (hashMove >> 6) & 63
+                targetMask = 1 << end
+                if (piece == WP or piece == BP) and self.enpassantPossible == (end >> 3, end & 7):
+                    targetMask |= 1 << ((start & 56) | (end & 7)) #en passant lands on the captured pawn's square
+                self.addLegalMoves(moves, 1 << start, targetMask)
+                for move in moves:
+                    if move & 0x7fff == hashMove:
+                        hashFound = True
+                        yield move
+                        break
+        #the consumer may have searched below this position since the last stage, put its pins and checks back
+        self.attackMap, self.inCheck, self.pins, self.checks = state
+        moves = self.addLegalMoves([], -1, self.colorBoards[1 if self.whiteToMove else 0])
+        if sortCaptures is not None:
+            sortCaptures(moves)
+        for move in moves:
+            if not (hashFound and move & 0x7fff == hashMove):
+                noisyFound = True
+                yield move
+        #promotions to an empty square: pawns on the seventh rank moving to the promotion row
+        self.attackMap, self.inCheck, self.pins, self.checks = state
+        if self.whiteToMove:
+            pawns, promotionRow = self.bitboards[WP] & rowMasks[1], rowMasks[0]
+        else:
+            pawns, promotionRow = self.bitboards[BP] & rowMasks[6], rowMasks[7]
+        if pawns:
+            for move in self.addLegalMoves([], pawns, promotionRow & ~self.occupied):
+                if not (hashFound and move & 0x7fff == hashMove):
+                    noisyFound = True
+                    yield move
+        if noisyOnly and not state[1] and (noisyFound or hashFound):
+            return
+        self.attackMap, self.inCheck, self.pins, self.checks = state
+        moves = self.addLegalMoves([], -1, ~self.occupied)
+        quiets = []
+        for move in moves:
+            if (hashFound and move & 0x7fff == hashMove) or move & (7 << PROMOTION_SHIFT): #promotions were handed out already
+                continue
+            quiets.append(move)
+        if sortQuiets is not None:
+            sortQuiets(quiets)
+        yield from quiets
+
 
 
     def checkForPinsAndChecks(self):
         pins = [] #squares where allied pinned piece is and direction pinned from
         checks = [] #squares where enemy is applying a check
         inCheck = False
+        bbs = self.bitboards
         if self.whiteToMove:
-            enemyColor = 'b'
-            allyColor = 'w'
+            enemy = 6 #number of the enemy's first piece (pawn), their other pieces follow it
+            ally = 0
             startRow = self.whiteKingLocation[0]
             startCol = self.whiteKingLocation[1]
         else:
-            enemyColor = 'w'
-            allyColor = 'b'
+            enemy = 0
+            ally = 6
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
+        kingSq = startRow*8 + startCol
+        allies = self.colorBoards[ally // 6]
+        enemies = self.colorBoards[enemy // 6]
+        occupied = allies | enemies
+        orthogonalAttackers = bbs[enemy + 3] | bbs[enemy + 4] #rooks and queens
+        diagonalAttackers = bbs[enemy + 2] | bbs[enemy + 4] #bishops and queens
 
         #Check outward from king for pins and checks, keep track of pins
-        directions = ((-1,0), (0,-1), (1,0), (0,1), (-1,-1), (-1,1), (1,-1), (1,1))
         for j in range(len(directions)):
             d = directions[j]
-            possiblePin = () #reset possible pin
-            for i in range(1,8):
-                endRow  = startRow + d[0]*i
-                endCol = startCol + d[1]*i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':
-                        if possiblePin == (): #1st allied piece should be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else: #2nd allied piece, so pin or check possible in this direction
-                            break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        #5 possibilities here in this complex conditional
-                        #1) orthogonally away from king and piece is a rook
-                        #2) diagonally away from king and piece is a bishop
-                        #3) 1 square away from king diagonally and the piece is a pawn
-                        #4) any direction and the piece is a queen
-                        #5) any direction 1 square away from the king and the piece is a king (this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == 'R')or(4 <= j <= 7 and type == 'B') or\
-                            (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7)or(enemyColor == 'b' and 4 <= j <= 5))) or\
-                                (type == 'Q')or(i==1 and type == 'K'):
-                            if possiblePin == (): #no piece blocking so check
-                                inCheck = True
-                                checks.append((endRow,endCol,d[0],d[1]))
-                                break
-                            else: #piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else: #enemy piece not applying check
-                            break
-                else: #off board
-                    break
-
-        #Check the knight moves
-        knightMoves = ((-2,-1),(-2,1),(1,-2),(1,2),(-1,2),(-1,-2),(2,-1),(2,1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece [1] == 'N': #enemy knight attacking the king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+            ray = rays[j]
+            blockers = ray[kingSq] & occupied
+            if not blockers: #nothing in this direction
+                continue
+            attackers = orthogonalAttackers if j < 4 else diagonalAttackers #sliders that move this way
+            #nearest piece to the king in this direction
+            endSq = (blockers & -blockers).bit_length() - 1 if rayIsPositive[j] else blockers.bit_length() - 1
+            if allies & (1 << endSq): #1st allied piece could be pinned, look at the piece behind it
+                blockers = ray[endSq] & occupied
+                if not blockers:
+                    continue
+                pinnerSq = (blockers & -blockers).bit_length() - 1 if rayIsPositive[j] else blockers.bit_length() - 1
+                if attackers & (1 << pinnerSq): #piece blocking so pin
+                    pins.append((endSq >> 3, endSq & 7, d[0], d[1]))
+            elif attackers & (1 << endSq): #no piece blocking so check
+                inCheck = True
+                checks.append((endSq >> 3, endSq & 7, d[0], d[1]))
+
+        #knights and pawns attack the king from the squares the same piece standing on the king's square would attack
+        jumpers = (knightAttacks[kingSq] & bbs[enemy + 1]) | (pawnAttacks[ally // 6][kingSq] & bbs[enemy])
+        while jumpers:
+            low = jumpers & -jumpers
+            endSq = low.bit_length() - 1
+            jumpers ^= low
+            inCheck = True
+            checks.append((endSq >> 3, endSq & 7, (endSq >> 3) - startRow, (endSq & 7) - startCol))
         
         return inCheck, pins, checks
        
+    '''
+    Bitmask of every square the given side attacks. The other side's king is taken off the board
+    first, so the squares behind it on a slider's line count as attacked and the king can't step
+    back along the check
+    '''
+    def attackedSquares(self, byWhite):
+        bbs = self.bitboards
+        side = 0 if byWhite else 6
+        occupied = self.occupied & ~bbs[BK if byWhite else WK]
+        pawns = bbs[side]
+        if byWhite: #white pawns capture towards row 0
+            attacks = ((pawns & ~fileMasks[0]) >> 9) | ((pawns & ~fileMasks[7]) >> 7)
+        else:
+            attacks = (((pawns & ~fileMasks[0]) << 7) | ((pawns & ~fileMasks[7]) << 9)) & 0xffffffffffffffff
+        for piece, table in ((side + 1, knightAttacks), (side + 5, kingAttacks)):
+            bb = bbs[piece]
+            while bb:
+                low = bb & -bb
+                attacks |= table[low.bit_length() - 1]
+                bb ^= low
+        for sliders, attackFunction in ((bbs[side + 3] | bbs[side + 4], rookAttacks), (bbs[side + 2] | bbs[side + 4], bishopAttacks)):
+            while sliders:
+                low = sliders & -sliders
+                attacks |= attackFunction(low.bit_length() - 1, occupied)
+                sliders ^= low
+        return attacks
+
+    '''
+    Determine if the side not to move attacks the square r,c (reads the attack map of the last move generation)
+    '''
+    def squareUnderAttack(self, r, c):
+        return (self.attackMap >> (r*8 + c)) & 1 == 1
+
     #All moves without considering checks
     
-    def getAllPossibleMoves(self):
-        moves = []
-        for r in range(len(self.board)): #No. of  rows
-            for c in range(len(self.board[r])): #No. of col in a specific row
-                turn = self.board[r][c][0]
-                if(turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r,c,moves) #For calling the appropiate functions of piece moves
-        return moves            
+    def getAllPossibleMoves(self, moves=None, fromMask=-1):
+        if moves is None:
+            moves = []
+        ally = 0 if self.whiteToMove else 6
+        bbs = self.bitboards
+        squares = self.squares
+        #pinned pieces are generated one by one so their moves can be kept on the pin line
+        pinned = 0
+        for pin in self.pins:
+            pinned |= 1 << (pin[0]*8 + pin[1])
+        unpinned = ~pinned & fromMask
+        self.addPawnMoves(bbs[ally] & unpinned, -1, moves)
+        knights = bbs[ally + 1] & unpinned #a pinned knight can never move
+        notAllies = ~self.colorBoards[ally // 6] & self.targetMask #empty space or enemy piece
+        base = (ally + 1) << PIECE_SHIFT
+        while knights:
+            low = knights & -knights
+            start = low.bit_length() - 1
+            knights ^= low
+            targets = knightAttacks[start] & notAllies
+            while targets:
+                low = targets & -targets
+                end = low.bit_length() - 1
+                targets ^= low
+                moves.append(base | start | end << 6 | squares[end] << CAPTURED_SHIFT)
+        moveFunctions = self.moveFunctions
+        for piece, offset in (('B',2), ('R',3), ('Q',4), ('K',5)):
+            bb = bbs[ally + offset] & unpinned
+            moveFunction = moveFunctions[piece]
+            while bb: #go through the pieces of this type, lowest square first
+                low = bb & -bb
+                sq = low.bit_length() - 1
+                bb ^= low
+                moveFunction(self, sq >> 3, sq & 7, moves) #For calling the appropiate functions of piece moves
+        for pin in self.pins:
+            if (fromMask >> (pin[0]*8 + pin[1])) & 1:
+                piece = pieceNames[squares[pin[0]*8 + pin[1]]]
+                moveFunctions[piece[1]](self, pin[0], pin[1], moves)
+        return moves
+
+    '''
+    Squares the piece located at row,col may move to without leaving its king, -1 (every square) when it is not pinned
+    (the pin list is only read, so a queen sees the same pin for its rook and bishop moves)
+    '''
+    def getPinMask(self,r,c):
+        for pin in self.pins:
+            if pin[0] == r and pin[1] == c:
+                kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+                return line[kingRow*8 + kingCol][r*8 + c] #the pin line through the piece, both ways
+        return -1
+
+    '''
+    En passant removes two pawns from the same row at once, so it can uncover a check on the king
+    that the pin scan doesn't see (both pawns between the king and a rook on that row)
+    '''
+    def enpassantIsLegal(self, start, end):
+        bbs = self.bitboards
+        if self.whiteToMove:
+            enemy = 6
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            enemy = 0
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow*8 + kingCol
+        occupied = (self.occupied ^ (1 << start) ^ (1 << ((start & 56) | (end & 7)))) | (1 << end)
+        return not (rookAttacks(kingSq, occupied) & (bbs[enemy + 3] | bbs[enemy + 4]) or
+                    bishopAttacks(kingSq, occupied) & (bbs[enemy + 2] | bbs[enemy + 4]))
+
+    '''
+    Turn a bitmask of target squares into moves for the piece located at row,col
+    '''
+    def addMoves(self,r,c,targets,moves):
+        squares = self.squares
+        start = r*8 + c
+        base = start | squares[start] << PIECE_SHIFT
+        targets &= self.targetMask
+        while targets:
+            low = targets & -targets
+            end = low.bit_length() - 1
+            targets ^= low
+            moves.append(base | end << 6 | squares[end] << CAPTURED_SHIFT)
+
+    '''
+    Generate moves for a whole set of pawns at once by shifting the bitboard, allowed masks the target squares
+    '''
+    def addPawnMoves(self,pawns,allowed,moves):
+        if not pawns:
+            return
+        squares = self.squares
+        empty = ~self.occupied
+        if self.whiteToMove: #white pawns move towards row 0 so their bitboard shifts right
+            piece, enemyPawn = WP, BP
+            enemies = self.colorBoards[1]
+            singles = (pawns >> 8) & empty
+            doubles = ((singles & rowMasks[5]) >> 8) & empty
+            leftCaptures = (pawns & ~fileMasks[0]) >> 9
+            rightCaptures = (pawns & ~fileMasks[7]) >> 7
+            pushOffset, leftOffset, rightOffset = 8, 9, 7
+            promotionRow = rowMasks[0]
+        else: #Black pawn moves
+            piece, enemyPawn = BP, WP
+            enemies = self.colorBoards[0]
+            singles = (pawns << 8) & empty
+            doubles = ((singles & rowMasks[2]) << 8) & empty
+            leftCaptures = (pawns & ~fileMasks[0]) << 7
+            rightCaptures = (pawns & ~fileMasks[7]) << 9
+            pushOffset, leftOffset, rightOffset = -8, -7, -9
+            promotionRow = rowMasks[7]
+        enpassantBit = 0
+        if self.enpassantPossible != () and self.targetMask & enemies: #en passant is generated with the captures
+            enpassantBit = 1 << (self.enpassantPossible[0]*8 + self.enpassantPossible[1])
+        captureTargets = (enemies & self.targetMask | enpassantBit) & allowed
+        allowed &= self.targetMask
+        pieceBits = piece << PIECE_SHIFT
+        for targets, offset, flags in ((singles & allowed, pushOffset, 0), (doubles & allowed, 2*pushOffset, FLAG_DOUBLE_PUSH),
+                                       (leftCaptures & captureTargets, leftOffset, 0), (rightCaptures & captureTargets, rightOffset, 0)):
+            while targets:
+                low = targets & -targets
+                end = low.bit_length() - 1
+                targets ^= low
+                start = end + offset
+                if low == enpassantBit:
+                    if self.enpassantIsLegal(start, end):
+                        moves.append(start | end << 6 | FLAG_ENPASSANT | pieceBits | enemyPawn << CAPTURED_SHIFT)
+                elif low & promotionRow: #pawn promotion, one move for each piece it can become
+                    move = start | end << 6 | pieceBits | squares[end] << CAPTURED_SHIFT
+                    for promotion in promotionPieces:
+                        moves.append(move | promotion << PROMOTION_SHIFT)
+                else:
+                    moves.append(start | end << 6 | flags | pieceBits | squares[end] << CAPTURED_SHIFT)
 
     '''
     Get all the pawn moves for the pawn located at row,col and add these moves to list
     '''
     def getPawnMoves(self,r,c,moves):
+        self.addPawnMoves(1 << (r*8 + c), self.getPinMask(r,c), moves)
 
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        
-        if self.whiteToMove: #white pawn moves
-            if self.board[r-1][c] == '--': #Empty square 1 square pawn advanced
-                if not piecePinned or pinDirection == (-1,0):    
-                    moves.append(Move((r,c),(r-1,c),self.board))
-                    if r == 6 and self.board[r-2][c] == '--': #2 square pawn advanced
-                        moves.append(Move((r,c),(r-2,c),self.board))
-            #captures
-            if c-1 >= 0: #captures to the left
-                if self.board[r-1][c-1][0] == 'b': #enemy piece to capture
-                    if not piecePinned or pinDirection == (-1,-1):    
-                        moves.append(Move((r,c),(r-1,c-1),self.board))
-                elif (r-1,c-1) == self.enpassantPossible:
-                    moves.append(Move((r,c),(r-1,c-1),self.board,enpassantPossible=True))
-            if c+1 <= 7: #captures to the right
-                if self.board[r-1][c+1][0] == 'b': #enemy piece to capture
-                    if not piecePinned or pinDirection == (-1,1):
-                        moves.append(Move((r,c),(r-1,c+1),self.board))
-                elif (r-1,c+1) == self.enpassantPossible:
-                    moves.append(Move((r,c),(r-1,c+1),self.board,enpassantPossible=True))
-        
-        else: #Black pawn moves
-            if self.board[r+1][c] == '--': #Empty square 1 square pawn advanced
-                if not piecePinned or pinDirection == (1,0):    
-                    moves.append(Move((r,c),(r+1,c),self.board))
-                    if r == 1 and self.board[r+2][c] == '--': #2 square pawn advanced
-                        moves.append(Move((r,c),(r+2,c),self.board))
-            #captures
-            if c-1 >= 0: #captures to the left
-                if self.board[r+1][c-1][0] == 'w': #enemy piece to capture
-                    if not piecePinned or pinDirection == (1,-1):    
-                        moves.append(Move((r,c),(r+1,c-1),self.board))
-                elif (r+1,c-1) == self.enpassantPossible:
-                    moves.append(Move((r,c),(r+1,c-1),self.board,enpassantPossible=True))
-            if c+1 <= 7: #captures to the right
-                if self.board[r+1][c+1][0] == 'w': #enemy piece to capture
-                    if not piecePinned or pinDirection == (1,1):    
-                        moves.append(Move((r,c),(r+1,c+1),self.board))
-                elif (r+1,c+1) == self.enpassantPossible:
-                    moves.append(Move((r,c),(r+1,c+1),self.board,enpassantPossible=True))
-        
-        #Add pawn promotions later
+    '''
+    Sliding moves along the given directions for the piece located at row,col
+    '''
+    def getSlidingMoves(self,r,c,moves,directionIndexes):
+        allowed = ~self.colorBoards[0 if self.whiteToMove else 1] & self.getPinMask(r,c) #empty squares and the enemy piece are valid
+        targets = 0
+        for j in directionIndexes:
+            attacks = rays[j][r*8 + c]
+            blockers = attacks & self.occupied
+            if blockers: #cut the ray off behind the nearest piece
+                if rayIsPositive[j]:
+                    blocker = (blockers & -blockers).bit_length() - 1
+                else:
+                    blocker = blockers.bit_length() - 1
+                attacks ^= rays[j][blocker]
+            targets |= attacks
+        self.addMoves(r, c, targets & allowed, moves)
 
     '''
     Get all the rook moves for the pawn located at row,col and add these moves to list
     '''
     def getRookMoves(self,r,c,moves):
-        
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q': #cant't remove queen from pin on rook moves, only remove it on bishop moves    
-                    self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1,0),(0,-1),(1,0),(0,1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1,8): #Rooks can move maximum 7 blocks
-                endRow = r + d[0]*i
-                endCol = c + d[1]*i
-                if 0 <= endRow < 8 and 0<= endCol < 8: # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):    
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == '--': #empty space valid
-                            moves.append(Move((r,c),(endRow,endCol),self.board))
-                        elif endPiece[0] == enemyColor: #enemy piece valid
-                            moves.append(Move((r,c),(endRow,endCol),self.board))
-                            break
-                        else: #friendly piece invalid
-                            break
-                else: #off board
-                    break
+        self.getSlidingMoves(r,c,moves,rookDirections)
 
     '''
     Get all the knight moves for the pawn located at row,col and add these moves to list
     '''
     def getKnightMoves(self,r,c,moves):
-
-        piecePinned = False
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        
-        direction = ((-2,-1),(-2,1),(1,-2),(1,2),(-1,2),(-1,-2),(2,-1),(2,1))
-        allyColor = 'w' if self.whiteToMove else 'b'
-        for m in direction:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:    
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor: #not an ally piece (empty space or enemy piece)
-                        moves.append(Move((r,c),(endRow,endCol),self.board))
+        if self.getPinMask(r,c) != -1: #a pinned knight can never move
+            return
+        allies = self.colorBoards[0 if self.whiteToMove else 1]
+        self.addMoves(r, c, knightAttacks[r*8 + c] & ~allies, moves) #not an ally piece (empty space or enemy piece)
 
     '''
     Get all the bishop moves for the pawn located at row,col and add these moves to list
     '''
     def getBishopMoves(self,r,c,moves):
-
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        
-        directions = ((-1,-1),(1,-1),(-1,1),(1,1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1,8): #Bishops can move maximum 7 blocks
-                endRow = r + d[0]*i
-                endCol = c + d[1]*i
-                if 0 <= endRow < 8 and 0<= endCol < 8: # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):    
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == '--': #empty space valid
-                            moves.append(Move((r,c),(endRow,endCol),self.board))
-                        elif endPiece[0] == enemyColor: #enemy piece valid
-                            moves.append(Move((r,c),(endRow,endCol),self.board))
-                            break
-                        else: #friendly piece invalid
-                            break
-                else: #off board
-                    break
+        self.getSlidingMoves(r,c,moves,bishopDirections)
 
     '''
     Get all the queen moves for the pawn located at row,col and add these moves to list
     '''
     def getQueenMoves(self,r,c,moves):
-        
-        self.getRookMoves(r,c,moves)
-        self.getBishopMoves(r,c,moves)
+        self.getSlidingMoves(r,c,moves,rookDirections + bishopDirections)
 
     '''
     Get all the king moves for the pawn located at row,col and add these moves to list
     '''
     def getKingMoves(self,r,c,moves):
-        
-        direction = ((-1,-1),(1,-1),(-1,1),(1,1),(-1,0),(0,-1),(1,0),(0,1))
-        allyColor = 'w' if self.whiteToMove else 'b'
-        for i in range(8):
-            endRow = r + direction[i][0]
-            endCol = c + direction[i][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: #not an ally piece (empty space or enemy piece)
-                    #place king on the end square and check for checks
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r,c),(endRow,endCol),self.board))
-                    #place king back to the original location
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r,c)
-                    else:
-                        self.blackKingLocation = (r,c)
+        allies = self.colorBoards[0 if self.whiteToMove else 1]
+        #not an ally piece (empty space or enemy piece) and not a square the enemy attacks
+        self.addMoves(r, c, kingAttacks[r*8 + c] & ~allies & ~self.attackMap, moves)
+
+    #generator function of each piece type, called with the GameState (kept on the class so instrumentation can wrap them)
+    moveFunctions = {  'p':getPawnMoves,'R':getRookMoves,'N':getKnightMoves,
+                       'B':getBishopMoves,'K':getKingMoves,'Q':getQueenMoves    }
 
 
 
 class Move():
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'promotionPiece', 'isEnpassantMove', 'moveID', 'packed')
 
     #Rank file notation for a chess board
     ranksToRows = {'1':7, '2':6,'3':5, '4':4, '5':3, '6':2, '7':1, '8':0}
@@ -446,7 +952,7 @@ class Move():
     filesToCol = {'a':0,'b':1,'c':2,'d':3,'e':4,'f':5,'g':6,'h':7}
     colsToFiles = {v:k for k,v in filesToCol.items()}
 
-    def __init__(self,startSq, endSq, board, enpassantPossible = False):
+    def __init__(self,startSq, endSq, board, enpassantPossible = False, promotionPiece = 'Q'):
         self.startRow = startSq[0]
         self.startCol = startSq[1]
         self.endRow = endSq[0]
@@ -460,24 +966,59 @@ class Move():
             self.isPawnPromotion = True
         elif self.pieceMoved == 'bp' and self.endRow == 7:
             self.isPawnPromotion = True
+        self.promotionPiece = promotionPiece if self.isPawnPromotion else ''
         #en passant
         self.isEnpassantMove = enpassantPossible
         if self.isEnpassantMove:
             self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
 
         self.moveID = self.startRow*1000 + self.startCol*100 + self.endRow*10 + self.endCol 
+
+        flags = 0
+        if self.isEnpassantMove:
+            flags = FLAG_ENPASSANT
+        elif self.pieceMoved[1] == 'p' and abs(self.startRow - self.endRow) == 2:
+            flags = FLAG_DOUBLE_PUSH
+        self.packed = packMove(self.startRow*8 + self.startCol, self.endRow*8 + self.endCol,
+                               pieceIndex.get(self.pieceMoved, EMPTY), pieceIndex.get(self.pieceCaptured, EMPTY),
+                               'NBRQ'.index(promotionPiece) + 1 if self.isPawnPromotion else 0, flags)
+
+    '''
+    Wrap a packed move from the engine
+    '''
+    @classmethod
+    def fromPacked(cls, packed):
+        move = cls.__new__(cls)
+        start = packed & 63
+        end = (packed >> 6) & 63
+        move.startRow = start >> 3
+        move.startCol = start & 7
+        move.endRow = end >> 3
+        move.endCol = end & 7
+        move.pieceMoved = squareNames[(packed >> PIECE_SHIFT) & 15]
+        move.pieceCaptured = squareNames[(packed >> CAPTURED_SHIFT) & 15]
+        promotion = (packed >> PROMOTION_SHIFT) & 7
+        move.isPawnPromotion = promotion != 0
+        move.promotionPiece = ' NBRQ'[promotion].strip()
+        move.isEnpassantMove = (packed & FLAG_ENPASSANT) != 0
+        move.moveID = move.startRow*1000 + move.startCol*100 + move.endRow*10 + move.endCol
+        move.packed = packed
+        return move
     
     '''
-    overriding the equals method
+    overriding the equals method (moves are equal when they go between the same squares with the same promotion)
     '''
     def __eq__(self, other):
         if isinstance(other,Move):
-            return self.moveID == other.moveID
+            return self.packed & 0x7fff == other.packed & 0x7fff
         return False
+
+    def __hash__(self):
+        return hash(self.packed & 0x7fff)
          
 
     def getChessNotation(self):
-            return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+            return moveNotation(self.packed)
     
     def getRankFile(self,r,c):
-        return self.colsToFiles[c] + self.rowsToRanks[r]
\ No newline at end of file
+        return self.colsToFiles[c] + self.rowsToRanks[r]
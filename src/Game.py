@@ -1,6 +1,8 @@
 import pygame as p
 import ChessEngine
 import os
+from searchWorker import SearchWorker
+from moveCache import MoveCache
 
 p.init()
 p.display.set_caption('Chess')
@@ -10,6 +12,12 @@ DIMENSION = 8 # 8x8 board
 SQ_SIZE = HEIGHT//DIMENSION
 MAX_FPS = 15
 IMAGES = {}
+BOARD_IMAGE = None #the empty board, drawn once by loadImages
+HIGHLIGHTS = {}
+colors = [p.Color("white"), p.Color("gray")]
+AI_TIME = 2.0 #seconds the AI thinks per move
+PONDER = True #let the AI think on the expected reply while the human is thinking
+MOVE_CACHE_SIZE = 4096 #positions whose legal moves are remembered
 
 #Stackover flow solution for loading image problem
 current_path = os.path.dirname(__file__) # Where your .py file is located
@@ -20,6 +28,15 @@ def loadImages():
     pieces = ['wp','bp','wB','bB','wK','bK','wN','bN','wQ','bQ','wR','bR']
     for piece in pieces:    
         IMAGES[piece] = p.transform.scale((p.image.load(os.path.join(image_path, str(piece)+'.png'))), (SQ_SIZE, SQ_SIZE))
+    global BOARD_IMAGE
+    BOARD_IMAGE = p.Surface((WIDTH, HEIGHT))
+    drawBoard(BOARD_IMAGE)
+    #highlight overlays, the same surfaces are blitted every time
+    for name in ('blue', 'yellow'):
+        s = p.Surface((SQ_SIZE,SQ_SIZE))
+        s.set_alpha(100) #transparency value scale of 0 to 255
+        s.fill(p.Color(name))
+        HIGHLIGHTS[name] = s
 
 
 def main():
@@ -27,6 +44,7 @@ def main():
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
+    gs.moveCache = MoveCache(MOVE_CACHE_SIZE) #moving back and forth with z asks for the same move lists again
     validMoves = gs.getValidMoves()
     moveMade = False #flag variable for when a move is made
     animate = False #Flag variable
@@ -34,13 +52,21 @@ def main():
     running = True
     sqSelected = () #No of square selected, keep track of the last click of the user (tuple(row, col))
     playerClicks = [] #keep track of player clicks
+    playerOne = True #True when a human plays white, False for the AI
+    playerTwo = False #same for black
+    drawn = [None]*64 #what is on screen on each square (piece, highlight), None to force a redraw
+    aiWorker = SearchWorker(AI_TIME) #searches on a background thread so the window stays responsive
     while running:
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
             if e.type == p.QUIT:
+                aiWorker.cancel()
                 running = False
+            elif e.type == p.VIDEOEXPOSE: #the window was covered, the whole board has to be drawn again
+                drawn = [None]*64
             
             #mouse event handlers
-            elif e.type == p.MOUSEBUTTONDOWN:
+            elif e.type == p.MOUSEBUTTONDOWN and humanTurn:
                 location = p.mouse.get_pos()
                 col = location[0] // SQ_SIZE
                 row = location[1] // SQ_SIZE
@@ -55,99 +81,141 @@ def main():
                     move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
                     print(move.getChessNotation())
                     for i in range(len(validMoves)):    
-                        if move == validMoves[i]:
+                        if (move.startRow, move.startCol, move.endRow, move.endCol) == \
+                                (validMoves[i].startRow, validMoves[i].startCol, validMoves[i].endRow, validMoves[i].endCol):
+                            aiWorker.playedMove(validMoves[i].packed) #keeps the ponder search if the AI expected this move
                             gs.makeMove(validMoves[i])
                             moveMade = True
                             animate = True
                             sqSelected = () # reset the user clicks
                             playerClicks = [] # reset the user clicks
+                            break #promotions match once per piece, the first one is the queen
                     if not moveMade:
                         playerClicks = [sqSelected]
             
             #key handlersz
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  #undo when z key is pressed
+                    aiWorker.cancel() #stop thinking about the position being taken back
                     gs.undo()
+                    if playerOne != playerTwo: #against the AI take its reply back too, back to the human's last move
+                        while gs.movelog and not ((gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)):
+                            gs.undo()
                     moveMade = True
                     animate = False
 
+        #AI move finder, the search runs in the background and is picked up once it is done
+        if not humanTurn and not moveMade and validMoves:
+            if not aiWorker.isThinking():
+                aiWorker.start(gs)
+            else:
+                result = aiWorker.poll()
+                if result is not None and result.bestMove is not None:
+                    gs.makeMove(result.bestMove)
+                    moveMade = True
+                    animate = True
+                    humanNext = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+                    if PONDER and humanNext and len(result.pv) > 1 and gs.drawReason() is None: #no pondering once the game is over
+                        aiWorker.ponder(gs, result.pv[1])
+
         if moveMade:
             if animate:
-                animateMove(gs.movelog[-1], screen, gs.board, clock)
+                animateMove(ChessEngine.Move.fromPacked(gs.movelog[-1]), screen, gs.board, clock, drawn)
             validMoves = gs.getValidMoves()
+            if gs.drawReason() is not None: #threefold repetition or fifty moves, the game is over
+                validMoves = []
             moveMade = False
             animate = False
 
-        drawGameState(screen, gs, validMoves, sqSelected)
+        dirty = drawGameState(screen, gs, validMoves, sqSelected, drawn)
         clock.tick(MAX_FPS)
-        p.display.flip()
+        if dirty:
+            p.display.update(dirty)
 
-#Highlight square selected and moves for piece selected
-def hightlightSquares(screen, gs, validMoves, sqSelected):
+#Highlight square selected and moves for piece selected, as a highlight name for each square
+def hightlightSquares(gs, validMoves, sqSelected):
+    highlights = [None]*64
     if sqSelected != ():
         r,c = sqSelected
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'): #sqSelected is a piece that can be moved
-            #highlight selected square
-            s = p.Surface((SQ_SIZE,SQ_SIZE))
-            s.set_alpha(100) #transparency value scale of 0 to 255
-            s.fill(p.Color('blue'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
+            highlights[r*8 + c] = 'blue' #highlight selected square
             #highlight moves from that square
-            s.fill(p.Color('yellow'))
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
-
-
-
-
-def drawGameState(screen, gs, validMoves, sqSelected):
-    drawBoard(screen)   #draw squares on the board
-    hightlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board) #draw the pieces on the board
+                    highlights[move.endRow*8 + move.endCol] = 'yellow'
+    return highlights
+
+
+'''
+Draw only the squares whose piece or highlight changed since the last frame (drawn remembers what is on
+screen and is updated), returns the rectangles to pass to p.display.update
+'''
+def drawGameState(screen, gs, validMoves, sqSelected, drawn):
+    highlights = hightlightSquares(gs, validMoves, sqSelected)
+    board = gs.board
+    dirty = []
+    for r in range(DIMENSION):
+        for c in range(DIMENSION):
+            square = (board[r][c], highlights[r*8 + c])
+            if drawn[r*8 + c] != square:
+                drawn[r*8 + c] = square
+                dirty.append(drawSquare(screen, r, c, square[0], square[1]))
+    return dirty
 
 
 def drawBoard(screen):
-    global colors
-    colors = [p.Color("white"), p.Color("gray")]
- 
     for r in range(DIMENSION):
         for c in range(DIMENSION):
             color = colors[((r+c)%2)] #picks even or odd box to color them
             p.draw.rect(screen, color, (c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))  # bug was here!! no need to use p.rect()!
 
 
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != '--': #empty squares
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-#Animating a move
-def animateMove(move, screen, board, clock):
-    global colors
-    coords = [] #list of coordinates that the animation will move to
+'''
+Redraw one square from the board image, with its highlight and piece on top
+'''
+def drawSquare(screen, r, c, piece, highlight=None):
+    rect = p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(BOARD_IMAGE, rect, rect)
+    if highlight is not None:
+        screen.blit(HIGHLIGHTS[highlight], rect)
+    if piece != '--': #empty squares
+        screen.blit(IMAGES[piece], rect)
+    return rect
+
+#Animating a move, only the squares under the moving piece are redrawn each frame
+def animateMove(move, screen, board, clock, drawn):
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
     framePerSquare = 10 #frames to move one square
     frameCount = (abs(dR)+abs(dC)) * framePerSquare
+    #the moving piece is not on its start square any more, and the end square shows the captured piece until it lands
+    drawn[move.startRow*8 + move.startCol] = None
+    drawn[move.endRow*8 + move.endCol] = None
+    dirty = [drawSquare(screen, move.startRow, move.startCol, '--')]
+    previous = None
     for frame in range(frameCount+1):
         r,c = (move.startRow + dR*frame/frameCount, move.startCol + dC*frame/frameCount)
-        drawBoard(screen)
-        drawPieces(screen,board)
-        #erase the piece move from its ending square
-        color = colors[(move.endRow + move.endCol)%2]
-        endSquare = p.Rect(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        #draw captured piece onto rectangle
-        if move.pieceCaptured != '--':
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
+        pieceRect = p.Rect(round(c*SQ_SIZE), round(r*SQ_SIZE), SQ_SIZE, SQ_SIZE)
+        #put back the squares the piece covered in the last frame
+        if previous is not None:
+            for row in range(previous.top // SQ_SIZE, (previous.bottom - 1) // SQ_SIZE + 1):
+                for col in range(previous.left // SQ_SIZE, (previous.right - 1) // SQ_SIZE + 1):
+                    piece = board[row][col]
+                    if (row, col) == (move.endRow, move.endCol):
+                        piece = move.pieceCaptured
+                    elif (row, col) == (move.startRow, move.startCol):
+                        piece = '--'
+                    drawSquare(screen, row, col, piece)
+                    drawn[row*8 + col] = None
+            dirty.append(previous)
         #draw the moving piece
-        screen.blit(IMAGES[move.pieceMoved],p.Rect(c*SQ_SIZE,r*SQ_SIZE, SQ_SIZE,SQ_SIZE))
-        p.display.flip()
+        screen.blit(IMAGES[move.pieceMoved], pieceRect)
+        dirty.append(pieceRect)
+        p.display.update(dirty)
+        dirty = []
+        previous = pieceRect
         clock.tick(60)
-    
+
 
 
 
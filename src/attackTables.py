@@ -0,0 +1,101 @@
+'''
+Attack and ray tables for the move generator, built once when the module is imported.
+Squares are bit numbers (row*8 + col, row 0 is rank 8) as in ChessEngine.
+
+    knightTargets[sq] / kingTargets[sq]  target squares as lists
+    knightAttacks[sq] / kingAttacks[sq]  the same as bitmasks
+    pawnAttacks[color][sq]               squares a pawn of that colour (0 white, 1 black) attacks
+    rays[direction][sq]                  squares strictly beyond sq in that direction
+    between[a][b]                        squares strictly between a and b, 0 if they don't share a line
+    line[a][b]                           the whole line through a and b edge to edge, 0 if they don't share one
+'''
+
+#rook directions first then bishop directions, as (row step, col step)
+directions = ((-1,0), (0,-1), (1,0), (0,1), (-1,-1), (-1,1), (1,-1), (1,1))
+rookDirections = (0,1,2,3)
+bishopDirections = (4,5,6,7)
+#direction goes towards higher bit numbers, so the nearest blocker is the lowest set bit
+rayIsPositive = tuple(dr*8 + dc > 0 for dr, dc in directions)
+oppositeDirection = tuple(directions.index((-dr,-dc)) for dr, dc in directions)
+
+rowMasks = [0xff << (8*r) for r in range(8)]
+fileMasks = [0x0101010101010101 << c for c in range(8)]
+
+
+def _buildJumpTargets(offsets):
+    targets = []
+    for sq in range(64):
+        r, c = sq >> 3, sq & 7
+        targets.append([(r+dr)*8 + c+dc for dr, dc in offsets if 0 <= r+dr < 8 and 0 <= c+dc < 8])
+    return targets
+
+def _toMasks(targetLists):
+    masks = []
+    for targets in targetLists:
+        mask = 0
+        for sq in targets:
+            mask |= 1 << sq
+        masks.append(mask)
+    return masks
+
+def _buildRays():
+    rays = []
+    for dr, dc in directions:
+        dirRays = []
+        for sq in range(64):
+            r, c = (sq >> 3) + dr, (sq & 7) + dc
+            mask = 0
+            while 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r*8 + c)
+                r, c = r + dr, c + dc
+            dirRays.append(mask)
+        rays.append(dirRays)
+    return rays
+
+def _buildBetweenAndLine(rays):
+    between = [[0]*64 for _ in range(64)]
+    line = [[0]*64 for _ in range(64)]
+    for a in range(64):
+        for j in range(8):
+            ray = rays[j][a]
+            whole = ray | rays[oppositeDirection[j]][a] | 1 << a
+            b = a
+            blockers = ray
+            while blockers: #walk out from a, everything passed so far is between a and b
+                b = (blockers & -blockers).bit_length() - 1 if rayIsPositive[j] else blockers.bit_length() - 1
+                between[a][b] = ray & ~rays[j][b] & ~(1 << b)
+                line[a][b] = whole
+                blockers &= ~(1 << b)
+    return between, line
+
+
+knightTargets = _buildJumpTargets(((-2,-1),(-2,1),(1,-2),(1,2),(-1,2),(-1,-2),(2,-1),(2,1)))
+kingTargets = _buildJumpTargets(((-1,-1),(1,-1),(-1,1),(1,1),(-1,0),(0,-1),(1,0),(0,1)))
+knightAttacks = _toMasks(knightTargets)
+kingAttacks = _toMasks(kingTargets)
+pawnAttacks = [_toMasks(_buildJumpTargets(((-1,-1),(-1,1)))), #white pawns capture towards row 0
+               _toMasks(_buildJumpTargets(((1,-1),(1,1))))]
+rays = _buildRays()
+between, line = _buildBetweenAndLine(rays)
+
+
+'''
+Squares a slider on sq attacks along the given directions, stopping at (and including) the
+first occupied square in each direction
+'''
+def slidingAttacks(sq, occupied, directionIndexes):
+    attacks = 0
+    for j in directionIndexes:
+        ray = rays[j][sq]
+        blockers = ray & occupied
+        if blockers: #cut the ray off behind the nearest piece
+            blocker = (blockers & -blockers).bit_length() - 1 if rayIsPositive[j] else blockers.bit_length() - 1
+            ray ^= rays[j][blocker]
+        attacks |= ray
+    return attacks
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, rookDirections)
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, bishopDirections)
@@ -0,0 +1,146 @@
+'''
+Evaluation of many positions at once with NumPy, for scoring datasets offline and for scoring all
+the children of a node in one go. Positions are encoded as an (N, 12, 64) array of 0/1 piece planes
+(plane = piece number, square = bit number as in ChessEngine) and every term is computed for the
+whole batch with array operations:
+
+    material + piece square tables    blended by game phase, the same numbers as minimax.scoreBoard
+    mobility                          pseudo legal moves of knights, bishops, rooks and queens
+    pawn structure                    doubled, isolated and passed pawns
+
+    planes = encodePositions(states)
+    scores = evaluateBatch(planes)    #centipawns, positive is good for white
+
+Needs numpy, which the rest of the engine doesn't.
+'''
+import numpy as np
+
+from ChessEngine import WP, WN, WB, WR, WQ, BP, middlegameSquareScores, endgameSquareScores, piecePhases
+from evaluationTables import PHASE_TOTAL
+
+mobilityWeights = {WN: 4, WB: 5, WR: 2, WQ: 1} #centipawns per pseudo legal move, black pieces use the white weight
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -15
+passedPawnBonus = np.array([0, 100, 60, 35, 20, 10, 5, 0]) #by row from white's side, row 1 is one step from queening
+
+knightOffsets = ((-2,-1),(-2,1),(1,-2),(1,2),(-1,2),(-1,-2),(2,-1),(2,1))
+rookSteps = ((-1,0),(0,-1),(1,0),(0,1))
+bishopSteps = ((-1,-1),(-1,1),(1,-1),(1,1))
+
+
+def _signedWeights(squareScores):
+    weights = np.array(squareScores, dtype=np.int32)
+    weights[6:] *= -1 #black pieces count against white
+    return weights
+
+#material plus piece square table for each piece on each square, middlegame and endgame
+middlegameWeights = _signedWeights(middlegameSquareScores)
+endgameWeights = _signedWeights(endgameSquareScores)
+phaseWeights = np.array(piecePhases, dtype=np.int32)
+_bitShifts = np.arange(64, dtype=np.uint64)
+
+
+'''
+(N, 12, 64) uint8 piece planes of a list of GameStates
+'''
+def encodePositions(states):
+    bitboards = np.array([gs.bitboards for gs in states], dtype=np.uint64).reshape(len(states), 12)
+    return ((bitboards[:, :, None] >> _bitShifts) & np.uint64(1)).astype(np.uint8)
+
+'''
+Move every piece of an (N, 8, 8) board by dr rows and dc columns, pieces pushed off the board are dropped
+'''
+def _shift(boards, dr, dc):
+    shifted = np.zeros_like(boards)
+    rows = slice(max(dr, 0), 8 + min(dr, 0))
+    cols = slice(max(dc, 0), 8 + min(dc, 0))
+    fromRows = slice(max(-dr, 0), 8 + min(-dr, 0))
+    fromCols = slice(max(-dc, 0), 8 + min(-dc, 0))
+    shifted[:, rows, cols] = boards[:, fromRows, fromCols]
+    return shifted
+
+def _count(boards):
+    return boards.reshape(len(boards), -1).sum(axis=1, dtype=np.int32)
+
+'''
+Pseudo legal moves of the pieces on the (N, 8, 8) boards, sliding along steps (one step only when not slides)
+'''
+def _mobility(pieces, own, empty, steps, slides):
+    moves = np.zeros(len(pieces), dtype=np.int32)
+    for dr, dc in steps:
+        reach = pieces
+        for _ in range(7 if slides else 1):
+            reach = _shift(reach, dr, dc)
+            moves += _count(reach & ~own)
+            reach = reach & empty #only empty squares let the piece slide on
+    return moves
+
+def mobilityScores(boards):
+    white = boards[:, :6].any(axis=1)
+    black = boards[:, 6:].any(axis=1)
+    empty = ~(white | black)
+    score = np.zeros(len(boards), dtype=np.int32)
+    for piece, weight in mobilityWeights.items():
+        steps, slides = {WN: (knightOffsets, False), WB: (bishopSteps, True),
+                         WR: (rookSteps, True), WQ: (rookSteps + bishopSteps, True)}[piece]
+        score += weight * _mobility(boards[:, piece], white, empty, steps, slides)
+        score -= weight * _mobility(boards[:, piece + 6], black, empty, steps, slides)
+    return score
+
+def pawnStructureScores(boards):
+    whitePawns = boards[:, WP]
+    blackPawns = boards[:, BP]
+    score = np.zeros(len(boards), dtype=np.int32)
+    for pawns, sign in ((whitePawns, 1), (blackPawns, -1)):
+        files = pawns.sum(axis=1, dtype=np.int32) #(N, 8) pawns on each file
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        neighbours = np.zeros_like(files)
+        neighbours[:, 1:] += files[:, :-1]
+        neighbours[:, :-1] += files[:, 1:]
+        isolated = np.where(neighbours == 0, files, 0).sum(axis=1)
+        score += sign * (DOUBLED_PAWN * doubled + ISOLATED_PAWN * isolated)
+    #a pawn is passed when no enemy pawn stands ahead of it on its own or a neighbouring file
+    def spread(pawns):
+        return pawns | _shift(pawns, 0, 1) | _shift(pawns, 0, -1)
+    blackAbove = _shift(np.maximum.accumulate(spread(blackPawns), axis=1), 1, 0) #black pawns in any lower row
+    whiteBelow = _shift(np.maximum.accumulate(spread(whitePawns)[:, ::-1], axis=1)[:, ::-1], -1, 0)
+    whitePassed = whitePawns & ~blackAbove
+    blackPassed = blackPawns & ~whiteBelow
+    score += (whitePassed.sum(axis=2, dtype=np.int32) * passedPawnBonus).sum(axis=1)
+    score -= (blackPassed.sum(axis=2, dtype=np.int32) * passedPawnBonus[::-1]).sum(axis=1)
+    return score
+
+'''
+Scores of an (N, 12, 64) batch in centipawns from white's point of view, or from the side to move's
+when whiteToMove (a length N sequence of bools) is given
+'''
+def evaluateBatch(planes, whiteToMove=None):
+    planes = np.asarray(planes, dtype=np.uint8)
+    counts = planes.astype(np.int32)
+    middlegame = np.einsum('npq,pq->n', counts, middlegameWeights)
+    endgame = np.einsum('npq,pq->n', counts, endgameWeights)
+    phase = np.minimum(counts.sum(axis=2) @ phaseWeights, PHASE_TOTAL)
+    total = middlegame * phase + endgame * (PHASE_TOTAL - phase)
+    scores = np.sign(total) * (np.abs(total) // PHASE_TOTAL) #rounded towards 0 like evaluationTables.taperedScore
+    boards = planes.astype(bool).reshape(len(planes), 12, 8, 8)
+    scores += mobilityScores(boards) + pawnStructureScores(boards)
+    if whiteToMove is not None:
+        scores = np.where(np.asarray(whiteToMove, dtype=bool), scores, -scores)
+    return scores
+
+'''
+(move, score) for every legal move of gs, scored from the point of view of the side making the move
+'''
+def evaluateChildren(gs):
+    moves = gs.generateLegalMoves()
+    children = []
+    for move in moves:
+        gs.makeMove(move)
+        children.append(gs.copy())
+        gs.undo()
+    if not children:
+        return []
+    scores = evaluateBatch(encodePositions(children))
+    if not gs.whiteToMove:
+        scores = -scores
+    return list(zip(moves, scores.tolist()))
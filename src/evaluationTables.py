@@ -0,0 +1,100 @@
+'''
+Evaluation tables shared by the engine (which keeps the evaluation up to date in makeMove/undo)
+and the search. The piece square tables below are the middlegame ones, the endgame has its own
+tables for pawns (worth more the further they are) and the king (which should come to the centre);
+the other pieces use the same table in both. The score is blended between the two by the game
+phase: the phase weights of the knights, bishops, rooks and queens on the board, PHASE_TOTAL
+at the start and 0 with only kings and pawns left.
+'''
+
+pieceScores = {'K':0, 'Q':900, 'R':500, 'B':330, 'N':320, 'p':100}
+
+#piece square tables from white's point of view, indexed by bit number (row 0 is rank 8),
+#black pieces look them up with the row flipped (square ^ 56)
+pawnScores = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+      5,  5, 10, 25, 25, 10,  5,  5,
+      0,  0,  0, 20, 20,  0,  0,  0,
+      5, -5,-10,  0,  0,-10, -5,  5,
+      5, 10, 10,-20,-20, 10, 10,  5,
+      0,  0,  0,  0,  0,  0,  0,  0]
+knightScores = [
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50]
+bishopScores = [
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20]
+rookScores = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+      5, 10, 10, 10, 10, 10, 10,  5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+      0,  0,  0,  5,  5,  0,  0,  0]
+queenScores = [
+    -20,-10,-10, -5, -5,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5,  5,  5,  5,  0,-10,
+     -5,  0,  5,  5,  5,  5,  0, -5,
+      0,  0,  5,  5,  5,  5,  0, -5,
+    -10,  5,  5,  5,  5,  5,  0,-10,
+    -10,  0,  5,  0,  0,  0,  0,-10,
+    -20,-10,-10, -5, -5,-10,-10,-20]
+kingScores = [
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -20,-30,-30,-40,-40,-30,-30,-20,
+    -10,-20,-20,-20,-20,-20,-20,-10,
+     20, 20,  0,  0,  0,  0, 20, 20,
+     20, 30, 10,  0,  0, 10, 30, 20]
+piecePositionScores = {'p':pawnScores, 'N':knightScores, 'B':bishopScores,
+                       'R':rookScores, 'Q':queenScores, 'K':kingScores}
+
+pawnEndgameScores = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     80, 80, 80, 80, 80, 80, 80, 80,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     30, 30, 30, 30, 30, 30, 30, 30,
+     15, 15, 15, 15, 15, 15, 15, 15,
+      5,  5,  5,  5,  5,  5,  5,  5,
+      0,  0,  0,  0,  0,  0,  0,  0,
+      0,  0,  0,  0,  0,  0,  0,  0]
+kingEndgameScores = [
+    -50,-40,-30,-20,-20,-30,-40,-50,
+    -30,-20,-10,  0,  0,-10,-20,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-30,  0,  0,  0,  0,-30,-30,
+    -50,-30,-30,-30,-30,-30,-30,-50]
+endgamePositionScores = dict(piecePositionScores, p=pawnEndgameScores, K=kingEndgameScores)
+
+phaseWeights = {'p':0, 'N':1, 'B':1, 'R':2, 'Q':4, 'K':0}
+PHASE_TOTAL = 24 #phase of the starting position
+
+'''
+Blend a middlegame and an endgame score by the phase (promotions can take it past PHASE_TOTAL)
+'''
+def taperedScore(middlegame, endgame, phase):
+    phase = min(phase, PHASE_TOTAL)
+    total = middlegame * phase + endgame * (PHASE_TOTAL - phase)
+    return total // PHASE_TOTAL if total >= 0 else -(-total // PHASE_TOTAL) #rounded towards 0 for both sides alike
@@ -0,0 +1,202 @@
+'''
+Switchable profiling of the engine: call counts and time spent in move generation, make/undo,
+Move construction and evaluation, plus nodes, qnodes, TT hits, cutoffs and NPS of every search
+iteration. Disabled (the default) nothing is wrapped and the engine runs its plain methods, so it
+costs nothing to leave in; enable swaps timing wrappers in on the classes and disable puts the
+originals back.
+
+    instrumentation.enable(logInterval=5.0)   #a summary line on stderr every 5 seconds, None for none
+    ...
+    print(instrumentation.toJson(indent=2))
+    instrumentation.disable()
+
+    python instrumentation.py --time 5 --fen "..."   #profile one search and print the snapshot
+
+Times are inclusive (getValidMoves contains generateLegalMoves, which contains the get*Moves calls)
+and the wrappers add about a microsecond to every call they time, so compare calls with each other
+rather than with an uninstrumented run.
+'''
+import argparse
+import collections
+import functools
+import json
+import sys
+import threading
+import time
+
+import ChessEngine
+import minimax
+from ChessEngine import GameState, Move
+
+#(class, method) timed while enabled, the counter is named class.method
+timedMethods = (
+    (GameState, 'getValidMoves'),
+    (GameState, 'generateLegalMoves'),
+    (GameState, 'checkForPinsAndChecks'),
+    (GameState, 'getAllPossibleMoves'),
+    (GameState, 'addPawnMoves'),
+    (GameState, 'getPawnMoves'),
+    (GameState, 'getKnightMoves'),
+    (GameState, 'getBishopMoves'),
+    (GameState, 'getRookMoves'),
+    (GameState, 'getQueenMoves'),
+    (GameState, 'getKingMoves'),
+    (GameState, 'makeMove'),
+    (GameState, 'undo'),
+    (Move, '__init__'),
+    (Move, 'fromPacked'),
+    (minimax.Searcher, 'evaluate'),
+)
+
+counters = {} #name -> [calls, seconds]
+iterations = collections.deque(maxlen=1000) #one dict per finished search iteration, the latest last
+_originals = {} #(class, name) -> attribute as it was before enable
+_enabledAt = None
+_logStop = None #threading.Event that ends the log thread
+
+
+def isEnabled():
+    return _enabledAt is not None
+
+def _counter(name):
+    return counters.setdefault(name, [0, 0.0])
+
+def _timed(name, function):
+    counter = _counter(name)
+    perfCounter = time.perf_counter
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = perfCounter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += perfCounter() - start
+    return timed
+
+'''
+searchRoot runs one iteration of iterative deepening, what the searcher counted during it is one entry of iterations
+'''
+def _timedIteration(function):
+    perfCounter = time.perf_counter
+    @functools.wraps(function)
+    def searchRoot(self, gs, rootMoves, depth, *args):
+        nodes, qnodes, ttHits, cutoffs = self.nodes, self.qnodes, self.ttHits, self.ordering.cutoffs
+        start = perfCounter()
+        result = function(self, gs, rootMoves, depth, *args)
+        seconds = perfCounter() - start
+        searched = self.nodes - nodes + self.qnodes - qnodes
+        iterations.append({'depth': depth, 'nodes': self.nodes - nodes, 'qnodes': self.qnodes - qnodes,
+                           'ttHits': self.ttHits - ttHits, 'cutoffs': self.ordering.cutoffs - cutoffs,
+                           'seconds': seconds, 'nps': searched / seconds if seconds else 0.0,
+                           'finished': not self.stopped})
+        return result
+    return searchRoot
+
+def _install(cls, name, wrapper):
+    original = cls.__dict__[name]
+    _originals[(cls, name)] = original
+    setattr(cls, name, wrapper)
+
+'''
+Start counting, logInterval (seconds) also writes logLine() to out that often
+'''
+def enable(logInterval=None, out=sys.stderr):
+    global _enabledAt, _logStop
+    if isEnabled():
+        return
+    for cls, name in timedMethods:
+        original = cls.__dict__[name]
+        counterName = f'{cls.__name__}.{name}'
+        if isinstance(original, classmethod):
+            _install(cls, name, classmethod(_timed(counterName, original.__func__)))
+        else:
+            _install(cls, name, _timed(counterName, original))
+    _install(minimax.Searcher, 'searchRoot', _timedIteration(minimax.Searcher.__dict__['searchRoot']))
+    #getAllPossibleMoves finds the piece generators through this table rather than the attributes
+    _originals[(GameState, 'moveFunctions')] = dict(GameState.moveFunctions)
+    for letter, function in GameState.moveFunctions.items():
+        GameState.moveFunctions[letter] = getattr(GameState, function.__name__)
+    _enabledAt = time.perf_counter()
+    if logInterval:
+        _logStop = threading.Event()
+        threading.Thread(target=_logLoop, args=(_logStop, logInterval, out), daemon=True).start()
+
+'''
+Stop counting and put the plain methods back, the counts are kept until reset
+'''
+def disable():
+    global _enabledAt, _logStop
+    if not isEnabled():
+        return
+    if _logStop is not None:
+        _logStop.set()
+        _logStop = None
+    for (cls, name), original in _originals.items():
+        if name == 'moveFunctions':
+            GameState.moveFunctions.update(original)
+        else:
+            setattr(cls, name, original)
+    _originals.clear()
+    _enabledAt = None
+
+def reset():
+    global _enabledAt
+    for counter in counters.values():
+        counter[0] = 0
+        counter[1] = 0.0
+    iterations.clear()
+    if isEnabled():
+        _enabledAt = time.perf_counter()
+
+def _logLoop(stop, interval, out):
+    while not stop.wait(interval):
+        print(logLine(), file=out, flush=True)
+
+
+'''
+Everything counted so far as plain dicts and lists, ready for json
+'''
+def snapshot():
+    timers = {}
+    for name, (calls, seconds) in counters.items():
+        timers[name] = {'calls': calls, 'seconds': seconds,
+                        'microsecondsPerCall': seconds / calls * 1e6 if calls else 0.0}
+    return {'enabled': isEnabled(),
+            'seconds': time.perf_counter() - _enabledAt if isEnabled() else 0.0,
+            'timers': timers,
+            'iterations': list(iterations)}
+
+def toJson(indent=None):
+    return json.dumps(snapshot(), indent=indent)
+
+'''
+One line summary: the five timers with the most time and the last search iteration
+'''
+def logLine():
+    snap = snapshot()
+    busiest = sorted(snap['timers'].items(), key=lambda item: -item[1]['seconds'])[:5]
+    parts = [f'{name} {timer["calls"]} calls {timer["seconds"]:.2f}s' for name, timer in busiest if timer['calls']]
+    if snap['iterations']:
+        last = snap['iterations'][-1]
+        parts.append(f'depth {last["depth"]} {last["nodes"] + last["qnodes"]} nodes {last["nps"]:.0f} nps')
+    return f'profile {snap["seconds"]:.1f}s: ' + (' | '.join(parts) or 'nothing counted yet')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile one search and print the instrumentation snapshot')
+    parser.add_argument('--fen', default=None, help='position to search (default: the starting position)')
+    parser.add_argument('--time', type=float, default=5.0, help='seconds to search')
+    parser.add_argument('--depth', type=int, default=64)
+    parser.add_argument('--log-interval', type=float, default=None, help='seconds between summary lines on stderr')
+    args = parser.parse_args(argv)
+    gs = ChessEngine.GameState(args.fen)
+    enable(args.log_interval)
+    minimax.Searcher().search(gs, args.time, args.depth)
+    print(toJson(indent=2))
+    disable()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
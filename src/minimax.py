@@ -0,0 +1,330 @@
+'''
+Negamax alpha-beta search with iterative deepening, runs on one GameState with makeMove/undo
+(the position is never copied) and stops when its time budget runs out, answering with the
+best move of the deepest finished iteration.
+
+    searcher = Searcher()
+    result = searcher.search(gs, timeLimit=2.0)
+    gs.makeMove(result.bestMove)
+
+Moves inside the search (bestMove, pv) are the engine's packed ints, see ChessEngine.moveNotation
+'''
+import time
+
+import ChessEngine
+from ChessEngine import EMPTY, CAPTURED_SHIFT, PROMOTION_SHIFT
+from transpositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from moveOrdering import MoveOrdering, sortCaptures
+from evaluationTables import taperedScore
+from tablebase import WIN, LOSS
+
+CHECKMATE = 100000
+STALEMATE = 0
+MAX_PLY = 128
+
+'''
+The move as stored in the transposition table: from square | to square << 6 | promotion << 12
+'''
+def moveKey(move):
+    return move & 0x7fff
+
+'''
+Mate scores are stored relative to the node instead of the root, so the same entry is right
+at whatever ply the position is reached
+'''
+def scoreToTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score + ply
+    if score <= -CHECKMATE + MAX_PLY:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score >= CHECKMATE - MAX_PLY:
+        return score - ply
+    if score <= -CHECKMATE + MAX_PLY:
+        return score + ply
+    return score
+
+'''
+Material plus piece square tables blended by the game phase, positive is good for white. This counts
+everything from scratch, the search reads the same score off the terms GameState keeps up to date
+'''
+def scoreBoard(gs):
+    middlegame, endgame, phase = gs.computeEvaluationTerms()
+    return taperedScore(middlegame[0] - middlegame[1], endgame[0] - endgame[1], phase)
+
+'''
+Search score of a tablebase (result, plies to mate) found ply plies from the root
+'''
+def tablebaseScore(value, ply):
+    result, plies = value
+    if result == WIN:
+        return CHECKMATE - ply - plies
+    if result == LOSS:
+        return -CHECKMATE + ply + plies
+    return STALEMATE
+
+
+class SearchResult():
+    def __init__(self):
+        self.bestMove = None
+        self.score = 0 #centipawns from the side to move's point of view
+        self.depth = 0 #deepest finished iteration
+        self.pv = [] #principal variation, starting with bestMove
+        self.nodes = 0
+        self.qnodes = 0
+        self.ttHits = 0
+        self.tablebaseHits = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.time = 0.0
+        self.fromBook = False #bestMove came from the opening book, nothing was searched
+        self.fromTablebase = False #bestMove and score came from the endgame tablebases, nothing was searched
+
+    def isMate(self):
+        return abs(self.score) >= CHECKMATE - MAX_PLY
+
+    '''
+    Fraction of beta cutoffs that came from the first move searched, a measure of move ordering
+    '''
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+
+class Searcher():
+    def __init__(self, hashMegabytes=16, book=None, tablebases=None):
+        self.tt = TranspositionTable(hashMegabytes) #kept between searches
+        self.book = book #openingBook.OpeningBook played from before searching, None for no book
+        self.tablebases = tablebases #tablebase.Tablebases answering the endings it has tables for, None for none
+        self.ordering = MoveOrdering(MAX_PLY) #killers and history, history is kept between searches
+        self.ttHits = 0
+        self.tablebaseHits = 0
+        self.nodes = 0
+        self.qnodes = 0
+        self.stopped = False
+        self.deadline = None
+        self.pvTable = [[] for _ in range(MAX_PLY + 1)] #pvTable[ply] is the best line found from that ply
+        self.previousPv = [] #principal variation of the last finished iteration, searched first
+
+    '''
+    Iterative deepening: search depth 1, 2, 3... until maxDepth or until timeLimit seconds have passed.
+    onIteration(result) is called after every finished depth (e.g. to print the current line),
+    rootMoves limits the search to those moves (all legal moves when None)
+    '''
+    def search(self, gs, timeLimit=None, maxDepth=64, onIteration=None, rootMoves=None):
+        start = time.perf_counter()
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.stopped = False
+        self.nodes = 0
+        self.qnodes = 0
+        self.ttHits = 0
+        self.tablebaseHits = 0
+        self.tt.newSearch()
+        self.ordering.newSearch()
+        result = SearchResult()
+        legalMoves = gs.generateLegalMoves()
+        if rootMoves is not None:
+            rootMoves = [move for move in legalMoves if move in rootMoves]
+        else:
+            rootMoves = legalMoves
+        if not rootMoves:
+            result.score = -CHECKMATE if gs.inCheck else STALEMATE
+            return result
+        if self.book is not None:
+            bookMove = self.book.chooseMove(gs)
+            if bookMove is not None and bookMove in rootMoves:
+                result.bestMove = bookMove
+                result.pv = [bookMove]
+                result.fromBook = True
+                result.time = time.perf_counter() - start
+                return result
+        if self.tablebases is not None:
+            best = self.tablebases.bestMove(gs, rootMoves)
+            if best is not None:
+                result.bestMove = best[0]
+                result.pv = [best[0]]
+                result.score = tablebaseScore(best[1:], 0)
+                result.fromTablebase = True
+                result.time = time.perf_counter() - start
+                return result
+        result.bestMove = rootMoves[0] #something to play even if the first iteration doesn't finish
+        result.pv = [rootMoves[0]]
+        maxDepth = min(maxDepth, MAX_PLY)
+        for depth in range(1, maxDepth + 1):
+            self.previousPv = result.pv
+            score, bestMove = self.searchRoot(gs, rootMoves, depth)
+            if bestMove is not None: #the first root move (the previous best) was searched to this depth
+                result.bestMove = bestMove
+                result.score = score
+                result.pv = list(self.pvTable[0])
+            if self.stopped:
+                break
+            result.depth = depth
+            result.nodes = self.nodes
+            result.qnodes = self.qnodes
+            result.ttHits = self.ttHits
+            result.tablebaseHits = self.tablebaseHits
+            result.cutoffs = self.ordering.cutoffs
+            result.firstMoveCutoffs = self.ordering.firstMoveCutoffs
+            result.time = time.perf_counter() - start
+            if onIteration is not None:
+                onIteration(result)
+            #put the best move first so the next iteration searches it first
+            rootMoves.remove(bestMove)
+            rootMoves.insert(0, bestMove)
+            if abs(score) >= CHECKMATE - MAX_PLY: #found a forced mate, deeper won't change it
+                break
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                break
+        result.nodes = self.nodes
+        result.qnodes = self.qnodes
+        result.ttHits = self.ttHits
+        result.tablebaseHits = self.tablebaseHits
+        result.cutoffs = self.ordering.cutoffs
+        result.firstMoveCutoffs = self.ordering.firstMoveCutoffs
+        result.time = time.perf_counter() - start
+        return result
+
+    '''
+    Returns (score, best move) for this depth, best move is None if the search was stopped
+    before the first root move was finished, or when alpha is given and no move scored above it
+    '''
+    def searchRoot(self, gs, rootMoves, depth, alpha=-CHECKMATE - 1):
+        beta = CHECKMATE + 1
+        bound = EXACT if alpha == -CHECKMATE - 1 else LOWER #above a given alpha only a lower bound is known
+        bestMove = None
+        for move in rootMoves:
+            gs.makeMove(move)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+            gs.undo()
+            if self.stopped:
+                break
+            if score > alpha:
+                alpha = score
+                bestMove = move
+                self.pvTable[0] = [move] + self.pvTable[1]
+        if bestMove is not None and not self.stopped:
+            self.tt.store(gs.zobristKey, depth, scoreToTable(alpha, 0), bound, moveKey(bestMove))
+        return alpha, bestMove
+
+    '''
+    Ask a running search (e.g. on another thread) to finish, it answers with the deepest finished iteration
+    '''
+    def stop(self):
+        self.stopped = True
+
+    def checkTime(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.stopped = True
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.pvTable[ply] = []
+        #a position that was on the board before is scored as a draw, the side that can do better will avoid it
+        if gs.halfmoveClock >= 100 or (gs.halfmoveClock >= 4 and gs.repetitions()):
+            return STALEMATE
+        if self.tablebases is not None:
+            value = self.tablebases.probe(gs)
+            if value is not None: #exact, no need to look any further
+                self.tablebaseHits += 1
+                return tablebaseScore(value, ply)
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.checkTime()
+        if self.stopped:
+            return 0
+        key = gs.zobristKey
+        hashMove = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            self.ttHits += 1
+            ttDepth, ttScore, bound, hashMove = entry
+            if ttDepth >= depth: #searched at least as deep before, the stored bound may settle this node
+                ttScore = scoreFromTable(ttScore, ply)
+                if bound == EXACT or (bound == LOWER and ttScore >= beta) or (bound == UPPER and ttScore <= alpha):
+                    return ttScore
+        if ply >= MAX_PLY:
+            return self.evaluate(gs)
+        if not hashMove and ply < len(self.previousPv): #no table move, try the previous iteration's line first
+            hashMove = moveKey(self.previousPv[ply])
+        moves = gs.generateStagedMoves(hashMove, sortCaptures, self.ordering.sortQuiets[ply])
+        inCheck = gs.inCheck
+        bestMove = None
+        moveNumber = 0
+        for move in moves:
+            moveNumber += 1
+            gs.makeMove(move)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undo()
+            if self.stopped:
+                return 0
+            if score >= beta:
+                self.ordering.cutoff(move, ply, depth, moveNumber)
+                self.tt.store(key, depth, scoreToTable(score, ply), LOWER, moveKey(move))
+                return score
+            if score > alpha:
+                alpha = score
+                bestMove = move
+                self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+        if not moveNumber:
+            return -CHECKMATE + ply if inCheck else STALEMATE
+        if bestMove is not None:
+            self.tt.store(key, depth, scoreToTable(alpha, ply), EXACT, moveKey(bestMove))
+        else:
+            self.tt.store(key, depth, scoreToTable(alpha, ply), UPPER, 0)
+        return alpha
+
+    '''
+    Only captures and promotions are searched (all moves when in check) so the leaf score
+    isn't taken in the middle of an exchange
+    '''
+    def quiescence(self, gs, alpha, beta, ply):
+        self.qnodes += 1
+        if self.qnodes & 1023 == 0:
+            self.checkTime()
+        if self.stopped:
+            return 0
+        if ply >= MAX_PLY:
+            return self.evaluate(gs)
+        moves = gs.generateStagedMoves(0, sortCaptures, None, True) #quiet moves only to tell a stalemate
+        inCheck = gs.inCheck
+        if not inCheck:
+            standPat = self.evaluate(gs)
+            if standPat >= beta:
+                return standPat
+            alpha = max(alpha, standPat)
+        hasMoves = False
+        for move in moves:
+            hasMoves = True
+            if not inCheck and (move >> CAPTURED_SHIFT) & 15 == EMPTY and not (move >> PROMOTION_SHIFT) & 7:
+                break #captures and promotions come first, only quiet moves are left
+            gs.makeMove(move)
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undo()
+            if self.stopped:
+                return 0
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        if not hasMoves:
+            return -CHECKMATE + ply if inCheck else STALEMATE
+        return alpha
+
+    '''
+    Score from the side to move's point of view
+    '''
+    def evaluate(self, gs):
+        middlegame = gs.middlegameScores
+        endgame = gs.endgameScores
+        score = taperedScore(middlegame[0] - middlegame[1], endgame[0] - endgame[1], gs.phase)
+        return score if gs.whiteToMove else -score
+
+
+'''
+Best move for the side to move within timeLimit seconds, None when there are no legal moves
+'''
+def findBestMove(gs, timeLimit=1.0, maxDepth=64):
+    bestMove = Searcher().search(gs, timeLimit, maxDepth).bestMove
+    return ChessEngine.Move.fromPacked(bestMove) if bestMove is not None else None
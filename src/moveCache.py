@@ -0,0 +1,56 @@
+'''
+Bounded least recently used cache of move generation results by zobrist key: the attack map,
+check and pins of a position and, once generateLegalMoves has run on it, its legal moves. Give a
+GameState one and positions seen again (undo/redo in the UI, replaying the same games, the
+search coming back to a position) skip move generation, or at least the check and pin scan.
+
+    gs.moveCache = MoveCache(capacity=50000)
+    ...
+    print(gs.moveCache.stats())
+
+The cache belongs to one GameState and one thread; GameState.copy doesn't pass it on.
+'''
+from collections import OrderedDict
+
+
+class MoveCache():
+    def __init__(self, capacity=50000):
+        self.capacity = capacity
+        self.entries = OrderedDict() #key -> [attackMap, inCheck, pins, checks, moves tuple or None], oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    '''
+    The entry of the position, None if it isn't cached (or, with needMoves, its moves aren't)
+    '''
+    def get(self, key, needMoves=False):
+        entry = self.entries.get(key)
+        if entry is None or (needMoves and entry[4] is None):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        entries = self.entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False) #least recently used
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'capacity': self.capacity, 'size': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'hitRate': self.hitRate()}
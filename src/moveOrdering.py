@@ -0,0 +1,81 @@
+'''
+Move ordering for the search, the better the first move at a node the more alpha-beta prunes.
+
+    captures    most valuable victim first, least valuable attacker among equal victims (MVV-LVA)
+    quiet moves the two killer moves of the ply (quiet moves that caused a cutoff at the same ply
+                elsewhere in the tree) first, then by the history table: a score per from and to
+                square that grows every time that move causes a cutoff, halved between searches
+
+The staged move generator calls sortCaptures and sortQuiets[ply] on each stage's list in place.
+cutoffs / firstMoveCutoffs measure how good the ordering is: a well ordered search gets most of
+its cutoffs from the first move searched at a node.
+'''
+from ChessEngine import PIECE_SHIFT, CAPTURED_SHIFT, PROMOTION_SHIFT, EMPTY
+
+
+'''
+MVV-LVA score of a capture (piece types are pawn 0 ... king 5), higher is searched first
+'''
+def mvvLva(move):
+    return ((move >> CAPTURED_SHIFT) & 15) % 6 * 8 + 5 - ((move >> PIECE_SHIFT) & 15) % 6 + \
+           ((move >> PROMOTION_SHIFT) & 7) * 64 #capturing with a queening pawn is best of all
+
+def sortCaptures(moves):
+    moves.sort(key=mvvLva, reverse=True)
+
+
+class MoveOrdering():
+    def __init__(self, maxPly):
+        self.killers = [[0, 0] for _ in range(maxPly + 1)] #two killer move keys per ply, newest first
+        self.history = [0]*4096 #indexed by from square | to square << 6
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.sortQuiets = [self.quietSorter(ply) for ply in range(maxPly + 1)]
+
+    '''
+    Called at the start of every search: killers belong to the old position, history keeps half its weight
+    '''
+    def newSearch(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        history = self.history
+        for i in range(4096):
+            history[i] >>= 1
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    def quietSorter(self, ply):
+        killers = self.killers[ply]
+        history = self.history
+        def quietScore(move):
+            key = move & 0x7fff
+            if key == killers[0]:
+                return 1 << 31
+            if key == killers[1]:
+                return 1 << 30
+            return history[move & 0xfff]
+        def sortQuiets(moves):
+            moves.sort(key=quietScore, reverse=True)
+        return sortQuiets
+
+    '''
+    A move caused a beta cutoff at this ply, moveNumber counts from 1 for the first move searched
+    '''
+    def cutoff(self, move, ply, depth, moveNumber):
+        self.cutoffs += 1
+        if moveNumber == 1:
+            self.firstMoveCutoffs += 1
+        if (move >> CAPTURED_SHIFT) & 15 != EMPTY or (move >> PROMOTION_SHIFT) & 7:
+            return #captures and promotions are ordered by MVV-LVA already
+        key = move & 0x7fff
+        killers = self.killers[ply]
+        if killers[0] != key:
+            killers[1] = killers[0]
+            killers[0] = key
+        self.history[move & 0xfff] += depth * depth
+
+    '''
+    Fraction of cutoffs that came from the first move searched
+    '''
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
@@ -0,0 +1,257 @@
+'''
+Standard algebraic notation (SAN), PGN and EPD for the engine, plus a loader that streams the
+positions out of PGN/EPD files of any size in constant memory.
+
+    notation.moveToSan(gs, move)         'Nbd7', 'exd6', 'e8=Q+' ...
+    notation.sanToMove(gs, 'Nf3')        packed move, ValueError if it isn't a legal move
+    notation.gameToPgn(gs, headers)      PGN of gs.movelog
+    for fen in notation.loadPositions('games.pgn', workers=8):
+        ...
+
+Castling isn't generated by the engine, so a PGN game stops being replayed at its first castling
+move (or any other move that can't be played): the loader keeps the positions up to there.
+'''
+import collections
+import multiprocessing
+import re
+
+import ChessEngine
+from ChessEngine import EMPTY, PIECE_SHIFT, CAPTURED_SHIFT, PROMOTION_SHIFT, pieceNames, Move
+
+startFen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+sevenTagRoster = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+results = ('1-0', '0-1', '1/2-1/2', '*')
+
+sanPattern = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+#comments, rest of line comments, NAGs, move numbers and results inside PGN movetext
+movetextNoise = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*')
+tagPattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+
+
+def squareName(sq):
+    return Move.colsToFiles[sq & 7] + Move.rowsToRanks[sq >> 3]
+
+'''
+SAN of a legal move (packed or a Move) in gs, the check (+) and mate (#) marks are worked out by playing it
+'''
+def moveToSan(gs, move):
+    if move.__class__ is Move:
+        move = move.packed
+    start = move & 63
+    end = (move >> 6) & 63
+    piece = (move >> PIECE_SHIFT) & 15
+    capture = (move >> CAPTURED_SHIFT) & 15 != EMPTY
+    promotion = (move >> PROMOTION_SHIFT) & 7
+    pieceType = pieceNames[piece][1]
+    if pieceType == 'p':
+        san = (squareName(start)[0] + 'x' if capture else '') + squareName(end)
+        if promotion:
+            san += '=' + 'NBRQ'[promotion - 1]
+    else:
+        #other pieces of the same kind that can reach the same square
+        others = [m & 63 for m in gs.generateLegalMoves()
+                  if (m >> 6) & 63 == end and (m >> PIECE_SHIFT) & 15 == piece and m & 63 != start]
+        disambiguation = ''
+        if others:
+            if all((sq & 7) != (start & 7) for sq in others):
+                disambiguation = squareName(start)[0]
+            elif all((sq >> 3) != (start >> 3) for sq in others):
+                disambiguation = squareName(start)[1]
+            else:
+                disambiguation = squareName(start)
+        san = pieceType + disambiguation + ('x' if capture else '') + squareName(end)
+    gs.makeMove(move)
+    replies = gs.generateLegalMoves()
+    if gs.inCheck:
+        san += '+' if replies else '#'
+    gs.undo()
+    return san
+
+'''
+The legal move of gs written as san (check marks and annotations like ! or ? are ignored)
+'''
+def sanToMove(gs, san):
+    text = san.rstrip('+#!?')
+    if text.startswith(('O-O', '0-0')):
+        raise ValueError(f'castling is not supported: {san}')
+    match = sanPattern.match(text)
+    if match is None:
+        raise ValueError(f'not a SAN move: {san}')
+    pieceType, fromFile, fromRank, target, promotion = match.groups()
+    pieceType = pieceType or 'p'
+    end = Move.ranksToRows[target[1]] * 8 + Move.filesToCol[target[0]]
+    promotion = 'NBRQ'.index(promotion) + 1 if promotion else 0
+    candidates = []
+    for move in gs.generateLegalMoves():
+        start = move & 63
+        if ((move >> 6) & 63 != end or pieceNames[(move >> PIECE_SHIFT) & 15][1] != pieceType or
+                (move >> PROMOTION_SHIFT) & 7 != promotion):
+            continue
+        if fromFile and squareName(start)[0] != fromFile or fromRank and squareName(start)[1] != fromRank:
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f'{"ambiguous" if candidates else "illegal"} move: {san}')
+    return candidates[0]
+
+
+'''
+PGN text from tags (dict), SAN moves and the result. comments[i] (optional) goes after move i.
+startFullmove / startWhite give the move number and side of the first move when the game
+doesn't start from the initial position
+'''
+def formatPgn(tags, sanMoves, result='*', comments=None, startFullmove=1, startWhite=True):
+    tags = dict(tags)
+    tags['Result'] = result
+    lines = [f'[{tag} "{tags.get(tag, "????.??.??" if tag == "Date" else "?")}"]' for tag in sevenTagRoster]
+    lines += [f'[{tag} "{value}"]' for tag, value in tags.items() if tag not in sevenTagRoster]
+    lines.append('')
+    tokens = []
+    for i, san in enumerate(sanMoves):
+        ply = i if startWhite else i + 1
+        if ply % 2 == 0:
+            tokens.append(f'{startFullmove + ply // 2}.')
+        elif i == 0:
+            tokens.append(f'{startFullmove}...')
+        tokens.append(san)
+        if comments is not None and comments[i]:
+            tokens.append('{' + comments[i] + '}')
+    tokens.append(result)
+    line = ''
+    for token in tokens: #PGN lines are kept under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+'''
+PGN of the moves played in gs, from the position it was set up with
+'''
+def gameToPgn(gs, tags=None, result='*'):
+    start = gs.copy()
+    while start.movelog:
+        start.undo()
+    tags = dict(tags or {})
+    fen = start.getFen()
+    if fen != startFen:
+        tags.setdefault('SetUp', '1')
+        tags.setdefault('FEN', fen)
+    sanMoves = []
+    for move in gs.movelog:
+        sanMoves.append(moveToSan(start, move))
+        start.makeMove(move)
+    return formatPgn(tags, sanMoves, result, startFullmove=int(fen.split()[5]), startWhite=fen.split()[1] == 'w')
+
+
+'''
+Yield (tags, movetext) for every game in an iterable of PGN lines (e.g. an open file), one game in memory at a time.
+The movetext keeps its line breaks, a ; comment runs to the end of its line
+'''
+def iterPgnGames(lines):
+    tags = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        match = tagPattern.match(line)
+        if match:
+            if movetext: #a tag after movetext starts the next game
+                yield tags, '\n'.join(movetext)
+                tags = {}
+                movetext = []
+            tags[match.group(1)] = match.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+    if tags or movetext:
+        yield tags, '\n'.join(movetext)
+
+'''
+The SAN moves in PGN movetext, without comments, variations, NAGs, move numbers and the result
+'''
+def parseMovetext(movetext):
+    #variations can nest, take out the innermost ones until none are left
+    movetext = movetextNoise.sub(' ', movetext)
+    while '(' in movetext:
+        stripped = re.sub(r'\([^()]*\)', ' ', movetext)
+        if stripped == movetext: #unbalanced bracket
+            break
+        movetext = stripped
+    return movetext.split()
+
+'''
+FEN of every position of a game: the start and the position after each move, stopping at the
+first move that can't be played
+'''
+def gamePositions(tags, movetext):
+    gs = ChessEngine.GameState(tags.get('FEN', startFen))
+    positions = [gs.getFen()]
+    for san in parseMovetext(movetext):
+        try:
+            gs.makeMove(sanToMove(gs, san))
+        except ValueError:
+            break
+        positions.append(gs.getFen())
+    return positions
+
+def _chunkPositions(games):
+    positions = []
+    for tags, movetext in games:
+        positions += gamePositions(tags, movetext)
+    return positions
+
+'''
+FEN of an EPD line (the four position fields, move counters from the hmvc/fmvn operations), None for blank lines
+'''
+def epdToFen(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        return None
+    halfmove, fullmove = '0', '1'
+    if len(fields) > 4:
+        for operation in fields[4].split(';'):
+            opcode, _, operand = operation.strip().partition(' ')
+            if opcode == 'hmvc':
+                halfmove = operand.strip()
+            elif opcode == 'fmvn':
+                fullmove = operand.strip()
+    return ' '.join(fields[:4]) + f' {halfmove} {fullmove}'
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+'''
+Stream the FEN of every position in a PGN file (every position of every game) or EPD file (one per
+line) without reading the whole file. With workers the PGN games are replayed on a process pool,
+chunkSize games per task with at most two tasks per worker in flight, and come out in file order
+'''
+def loadPositions(path, workers=None, chunkSize=100):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        if path.lower().endswith(('.epd', '.fen')):
+            for line in f:
+                fen = epdToFen(line)
+                if fen is not None:
+                    yield fen
+            return
+        games = iterPgnGames(f)
+        if not workers:
+            for tags, movetext in games:
+                yield from gamePositions(tags, movetext)
+            return
+        with multiprocessing.Pool(workers) as pool:
+            pending = collections.deque()
+            for chunk in _chunks(games, chunkSize):
+                pending.append(pool.apply_async(_chunkPositions, (chunk,)))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
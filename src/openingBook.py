@@ -0,0 +1,148 @@
+'''
+Opening book in a binary file of fixed size records sorted by position key, laid out like a
+Polyglot book so a reader can mmap it and binary search it without loading anything into Python
+objects; any number of engine processes then share one copy through the page cache.
+
+Record (16 bytes, big endian):
+    key     8 bytes  the position's zobrist key (ChessEngine's keys, not Polyglot's)
+    move    2 bytes  from square | to square << 6 | promotion << 12, as in the transposition table
+    weight  2 bytes  how good the move did: 2 per win and 1 per draw for the side that played it
+    learn   4 bytes  0, kept for the record layout
+
+    python openingBook.py build games.pgn more.pgn -o book.bin --max-ply 20
+    python openingBook.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+'''
+import argparse
+import mmap
+import struct
+import sys
+
+import ChessEngine
+import notation
+
+record = struct.Struct('>QHHI')
+RECORD_SIZE = record.size
+
+
+'''
+Count the moves played in the first maxPly plies of every game in the PGN files and write the
+book to outPath, returns the number of records written
+'''
+def buildBook(pgnPaths, outPath, maxPly=20, minWeight=1):
+    weights = {} #(key, move) -> weight
+    for path in pgnPaths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for tags, movetext in notation.iterPgnGames(f):
+                result = tags.get('Result', '*')
+                gs = ChessEngine.GameState(tags.get('FEN', notation.startFen))
+                for san in notation.parseMovetext(movetext)[:maxPly]:
+                    try:
+                        move = notation.sanToMove(gs, san)
+                    except ValueError: #castling or a broken game, the rest can't be replayed
+                        break
+                    if result == '1/2-1/2':
+                        score = 1
+                    elif result == ('1-0' if gs.whiteToMove else '0-1'):
+                        score = 2
+                    else:
+                        score = 0
+                    entry = (gs.zobristKey, move & 0x7fff)
+                    weights[entry] = weights.get(entry, 0) + score
+                    gs.makeMove(move)
+    entries = [(key, move, weight) for (key, move), weight in weights.items() if weight >= minWeight]
+    entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1])) #best move first within a position
+    scale = max([weight for _, _, weight in entries] + [0xffff]) / 0xffff #weights have to fit in 16 bits
+    with open(outPath, 'wb') as out:
+        for key, move, weight in entries:
+            out.write(record.pack(key, move, max(1, int(weight / scale)), 0))
+    return len(entries)
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: #an empty file can't be mapped
+            self.data = b''
+        self.size = len(self.data) // RECORD_SIZE
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    '''
+    (move key, weight) of every record for the position key, best first
+    '''
+    def lookup(self, key):
+        data = self.data
+        low, high = 0, self.size
+        while low < high: #first record with a key >= key
+            middle = (low + high) // 2
+            if struct.unpack_from('>Q', data, middle * RECORD_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            recordKey, move, weight, _ = record.unpack_from(data, low * RECORD_SIZE)
+            if recordKey != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    '''
+    (packed move, weight) for the book moves that are legal in gs
+    '''
+    def probe(self, gs):
+        entries = self.lookup(gs.zobristKey)
+        if not entries:
+            return []
+        legal = {move & 0x7fff: move for move in gs.generateLegalMoves()}
+        return [(legal[move], weight) for move, weight in entries if move in legal]
+
+    '''
+    A book move for gs, None when the position isn't in the book. The highest weight is played
+    unless rng is given, then moves are picked at random in proportion to their weight
+    '''
+    def chooseMove(self, gs, rng=None):
+        moves = self.probe(gs)
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0][0]
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or probe an opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='compile PGN files into a book')
+    build.add_argument('pgn', nargs='+')
+    build.add_argument('-o', '--output', default='book.bin')
+    build.add_argument('--max-ply', type=int, default=20, help='plies of each game that go in the book')
+    build.add_argument('--min-weight', type=int, default=1, help='leave out moves with a lower weight')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=notation.startFen)
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        print(f'{buildBook(args.pgn, args.output, args.max_ply, args.min_weight)} records written to {args.output}')
+        return 0
+    gs = ChessEngine.GameState(args.fen)
+    with OpeningBook(args.book) as book:
+        for move, weight in book.probe(gs):
+            print(f'{notation.moveToSan(gs, move):8} {weight}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+'''
+Root-split parallel search over a pool of worker processes (one Python process per core, so the
+GIL doesn't matter). Iterative deepening runs here: at every depth the first root move (the best
+of the last depth) is searched first by one worker, then the other root moves are dealt out round
+robin to all the workers with that move's score as alpha, so they only spend time on moves that
+could beat it. The best move is the highest score, ties going to the move that comes first in the
+root move order, which is the order (and tie rule) of the serial Searcher. Each worker keeps its
+own Searcher (and transposition table) between searches.
+
+    with ParallelSearcher(workers=8) as searcher:
+        result = searcher.search(gs, timeLimit=2.0)
+
+    python parallelSearch.py --depth 4 --workers 1 2 4 8
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import ChessEngine
+from minimax import Searcher, SearchResult, CHECKMATE, STALEMATE, MAX_PLY
+
+_workerSearcher = None #the Searcher of a worker process, made once by the pool initializer
+
+
+def _initWorker(hashMegabytes):
+    global _workerSearcher
+    _workerSearcher = Searcher(hashMegabytes)
+
+'''
+What a worker needs to rebuild the position with its history (halfmove clock, castling rights and
+the keys for repetitions): the fen before the first move of the game and the packed moves since
+'''
+def positionOf(gs):
+    start = gs.copy()
+    while start.movelog:
+        start.undo()
+    return start.getFen(), list(gs.movelog)
+
+def loadPosition(position):
+    fen, movelog = position
+    gs = ChessEngine.GameState(fen)
+    for move in movelog:
+        gs.makeMove(move)
+    return gs
+
+'''
+Runs in a worker: search the given root moves to depth with alpha as the score to beat, returns
+(score, pv or None when no move beat alpha, stopped, nodes, qnodes, ttHits)
+'''
+def _searchRootMoves(position, rootMoves, depth, alpha, previousPv, timeLimit, newSearch):
+    gs = loadPosition(position)
+    searcher = _workerSearcher
+    if newSearch: #first depth of a new search, same as Searcher.search does
+        searcher.tt.newSearch()
+        searcher.ordering.newSearch()
+    searcher.deadline = time.perf_counter() + timeLimit if timeLimit is not None else None
+    searcher.stopped = False
+    searcher.nodes = 0
+    searcher.qnodes = 0
+    searcher.ttHits = 0
+    searcher.previousPv = previousPv
+    score, bestMove = searcher.searchRoot(gs, rootMoves, depth, alpha)
+    pv = list(searcher.pvTable[0]) if bestMove is not None else None
+    return score, pv, searcher.stopped, searcher.nodes, searcher.qnodes, searcher.ttHits
+
+
+class ParallelSearcher():
+    def __init__(self, workers=None, hashMegabytes=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = multiprocessing.Pool(self.workers, _initWorker, (hashMegabytes,))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    '''
+    Same answer as Searcher.search, with nodes, qnodes and ttHits summed over the workers
+    '''
+    def search(self, gs, timeLimit=None, maxDepth=64):
+        start = time.perf_counter()
+        deadline = start + timeLimit if timeLimit is not None else None
+        result = SearchResult()
+        rootMoves = gs.generateLegalMoves()[:]
+        if not rootMoves:
+            result.score = -CHECKMATE if gs.inCheck else STALEMATE
+            return result
+        position = positionOf(gs)
+        result.bestMove = rootMoves[0] #something to play even if the first depth doesn't finish
+        result.pv = [rootMoves[0]]
+        for depth in range(1, min(maxDepth, MAX_PLY) + 1):
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+            score, pv, stopped, *counts = self.pool.apply(_searchRootMoves,
+                (position, rootMoves[:1], depth, -CHECKMATE - 1, result.pv, remaining, depth == 1))
+            self.addCounts(result, [counts])
+            if stopped: #the best move of the last depth wasn't searched to this depth
+                break
+            best = (score, pv)
+            others = rootMoves[1:]
+            if others:
+                remaining = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+                groups = [others[i::self.workers] for i in range(min(self.workers, len(others)))]
+                replies = self.pool.starmap(_searchRootMoves, [(position, group, depth, score, result.pv, remaining, False)
+                                                               for group in groups])
+                self.addCounts(result, [reply[3:] for reply in replies])
+                order = {move: i for i, move in enumerate(rootMoves)}
+                for groupScore, groupPv, _, _, _, _ in replies:
+                    if groupPv is not None and (groupScore > best[0] or
+                                                (groupScore == best[0] and order[groupPv[0]] < order[best[1][0]])):
+                        best = (groupScore, groupPv)
+                stopped = any(reply[2] for reply in replies)
+            result.score, result.pv = best
+            result.bestMove = result.pv[0]
+            if stopped:
+                break
+            result.depth = depth
+            #put the best move first so the next depth searches it first, as Searcher.search does
+            rootMoves.remove(result.bestMove)
+            rootMoves.insert(0, result.bestMove)
+            if abs(result.score) >= CHECKMATE - MAX_PLY:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        result.time = time.perf_counter() - start
+        return result
+
+    def addCounts(self, result, counts):
+        for nodes, qnodes, ttHits in counts:
+            result.nodes += nodes
+            result.qnodes += qnodes
+            result.ttHits += ttHits
+
+
+'''
+Time a fixed depth search of the position with each worker count, speedup is against the first count
+'''
+def benchmark(fen, depth, workerCounts, out=sys.stdout):
+    gs = ChessEngine.GameState()
+    gs.loadFen(fen)
+    baseTime = None
+    for workers in workerCounts:
+        with ParallelSearcher(workers) as searcher:
+            result = searcher.search(gs, maxDepth=depth)
+        if baseTime is None:
+            baseTime = result.time
+        nodes = result.nodes + result.qnodes
+        print(f'{workers:3} workers: {ChessEngine.moveNotation(result.bestMove)} score {result.score:6} '
+              f'{nodes:>9} nodes in {result.time:7.3f}s ({nodes / max(result.time, 1e-9):>8.0f} nps)'
+              f' speedup {baseTime / max(result.time, 1e-9):5.2f}x', file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel search speedup benchmark')
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args(argv)
+    benchmark(args.fen, args.depth, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
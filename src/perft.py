@@ -0,0 +1,131 @@
+'''
+Perft: counts the leaf nodes of the legal move tree to a fixed depth. The counts for the
+reference positions below are known exactly, so any difference points to a bug in
+getValidMoves / makeMove / undo, and the nodes per second track move generation speed.
+Castling isn't generated yet, so a wrong count in a position whose FEN grants castling rights is
+reported as a known failure and only the other mismatches fail the suite.
+
+    python perft.py --depth 4
+    python perft.py --fen "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -" --depth 3 --divide
+    python perft.py --suite --max-nodes 1000000
+'''
+import argparse
+import sys
+import time
+
+import ChessEngine
+
+startFen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+#(name, fen, known node counts for depth 1, 2, 3...)
+referencePositions = [
+    ('start position', startFen,
+        [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        [48, 2039, 97862, 4085603, 193690690]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        [6, 264, 9467, 422333, 15833292]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        [44, 1486, 62379, 2103487, 89941194]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(gs, depth, buffers=None):
+    if buffers is None: #one move list per remaining depth, reused at every node
+        buffers = [[] for _ in range(depth + 1)]
+    moves = gs.generateLegalMoves(buffers[depth])
+    if depth <= 1: #bulk count the last ply instead of making every move
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth-1, buffers)
+        gs.undo()
+    return nodes
+
+'''
+Node count below each root move, the usual way to narrow a wrong total down to one line
+'''
+def divide(gs, depth):
+    counts = []
+    for move in gs.generateLegalMoves():
+        gs.makeMove(move)
+        counts.append((ChessEngine.moveNotation(move), perft(gs, depth-1)))
+        gs.undo()
+    return counts
+
+
+def loadPosition(fen):
+    gs = ChessEngine.GameState()
+    gs.loadFen(fen)
+    return gs
+
+
+def runPerft(fen, depth, showDivide=False, out=sys.stdout):
+    gs = loadPosition(fen)
+    start = time.perf_counter()
+    if showDivide:
+        counts = divide(gs, depth)
+        for notation, nodes in counts:
+            print(f'{notation}: {nodes}', file=out)
+        nodes = sum(n for _, n in counts)
+    else:
+        nodes = perft(gs, depth)
+    elapsed = time.perf_counter() - start
+    print(f'depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):.0f} nps)', file=out)
+    return nodes
+
+'''
+Run every reference position up to the deepest depth whose known count is within maxNodes,
+returns the number of mismatches, not counting the known failures of positions with castling rights
+'''
+def runSuite(maxNodes, out=sys.stdout):
+    failures = 0
+    knownFailures = 0
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, counts in referencePositions:
+        for depth, expected in enumerate(counts, start=1):
+            if expected > maxNodes:
+                break
+            gs = loadPosition(fen)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            castling = fen.split()[2] != '-' #castling isn't generated, these counts can't match yet
+            if nodes == expected:
+                status = 'ok'
+            elif castling:
+                status = 'known'
+                knownFailures += 1
+            else:
+                status = 'FAIL'
+                failures += 1
+            print(f'{status:5} {name:15} depth {depth}: {nodes:>10} (expected {expected:>10})'
+                  f' {elapsed:8.3f}s {nodes / max(elapsed, 1e-9):>9.0f} nps', file=out)
+    print(f'{failures} mismatches ({knownFailures} known failures without castling), {totalNodes} nodes in {totalTime:.3f}s ({totalNodes / max(totalTime, 1e-9):.0f} nps)', file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft move generator test and benchmark')
+    parser.add_argument('--fen', default=startFen, help='position to count from (default: start position)')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count below each root move')
+    parser.add_argument('--suite', action='store_true', help='run the reference positions and compare node counts')
+    parser.add_argument('--max-nodes', type=int, default=200000, help='deepest suite depth to run, by known node count')
+    args = parser.parse_args(argv)
+    if args.suite:
+        return 1 if runSuite(args.max_nodes) else 0
+    runPerft(args.fen, args.depth, args.divide)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
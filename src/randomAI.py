@@ -1 +1,10 @@
 #AI moves of the chess game will be add here later
+import random
+
+'''
+Pick a random move out of the valid moves (packed ints or Move objects), None when there are none
+'''
+def findRandomMove(validMoves, rng=random):
+    if not validMoves:
+        return None
+    return validMoves[rng.randint(0, len(validMoves)-1)]
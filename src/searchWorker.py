@@ -0,0 +1,107 @@
+'''
+Runs the AI's search on a background thread so the pygame loop keeps drawing and handling events
+while the engine thinks. The search works on its own copy of the position and hands its answer
+back through a queue, which the UI polls once a frame.
+
+    worker = SearchWorker(timeLimit=2.0)
+    worker.start(gs)
+    ...
+    move = worker.poll() #None until the search is done
+
+While the human thinks, the worker can ponder: search the position after the reply the last
+search expected. If the human plays that move the search carries on, with the time already spent
+pondering counted against its budget, so it usually answers at once, otherwise it is dropped; the transposition
+table keeps what it learned either way.
+
+    worker.ponder(gs, result.pv[1])
+    ...
+    worker.playedMove(move) #True on a ponder hit, the answer then comes from poll as usual
+'''
+import queue
+import threading
+import time
+
+from minimax import Searcher
+
+
+class SearchWorker():
+    def __init__(self, timeLimit=1.0, hashMegabytes=16):
+        self.timeLimit = timeLimit
+        self.searcher = Searcher(hashMegabytes) #kept between moves so the transposition table stays warm
+        self.results = queue.Queue()
+        self.thread = None
+        self.searchId = 0 #answers from cancelled searches carry an old id and are thrown away
+        self.ponderMove = None #the reply being pondered on, None when not pondering
+        self.ponderStart = 0.0
+
+    def isThinking(self):
+        return self.thread is not None
+
+    def isPondering(self):
+        return self.ponderMove is not None
+
+    '''
+    Start searching the side to move's best move in gs
+    '''
+    def start(self, gs):
+        self.cancel()
+        self.searchId += 1
+        self.thread = threading.Thread(target=self.run, args=(gs.copy(), self.searchId, self.timeLimit), daemon=True)
+        self.thread.start()
+
+    '''
+    Search the position after move (the expected reply in gs) with no time limit until playedMove is called
+    '''
+    def ponder(self, gs, move):
+        self.cancel()
+        self.searchId += 1
+        gs = gs.copy()
+        gs.makeMove(move)
+        self.ponderMove = move
+        self.ponderStart = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, args=(gs, self.searchId, None), daemon=True)
+        self.thread.start()
+
+    '''
+    The human played move (packed), returns True if it was the pondered move: the search keeps going
+    until timeLimit seconds after the pondering started (it stops at once if that has passed).
+    Any other move drops the ponder search
+    '''
+    def playedMove(self, move):
+        if self.ponderMove is None:
+            return False
+        if move != self.ponderMove:
+            self.cancel()
+            return False
+        self.ponderMove = None
+        self.searcher.deadline = self.ponderStart + self.timeLimit
+        return True
+
+    def run(self, gs, searchId, timeLimit):
+        result = self.searcher.search(gs, timeLimit)
+        self.results.put((searchId, result))
+
+    '''
+    The finished search's SearchResult, or None while it is still thinking (or nothing was started)
+    '''
+    def poll(self):
+        while True:
+            try:
+                searchId, result = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if searchId == self.searchId:
+                self.thread = None
+                return result
+
+    '''
+    Stop the search (after an undo, or when the window closes) and forget its answer
+    '''
+    def cancel(self):
+        if self.thread is not None:
+            while self.thread.is_alive(): #stop again in case the search hadn't started when it was first asked
+                self.searcher.stop()
+                self.thread.join(0.01)
+            self.thread = None
+        self.ponderMove = None
+        self.searchId += 1
@@ -0,0 +1,375 @@
+'''
+Endgame tablebases: perfect play for endings with a few pieces, worked out backwards from the
+mates (retrograde analysis) with GameState's own move generation and stored one file per
+material signature ('KQK', 'KRK', 'KPK', 'KQKR' ...), the stronger side always as white.
+
+Every position of a table is one byte at the position's index, from the side to move's point of view:
+    0           draw (and the illegal positions, which are never probed)
+    1..127      the side to move mates in that many plies
+    128 | d     the side to move is mated in d plies (128 is checkmate on the board)
+Positions are reduced by symmetry before indexing: without pawns the white king is mirrored
+into the a1-d1-d4 triangle (10 squares instead of 64), with pawns onto files a-d. The files are
+memory mapped, so probing one costs a single byte read and processes share the pages.
+
+    python tablebase.py build KQK KRK KPK -d tablebases
+    python tablebase.py probe --fen "4k3/8/4P3/4K3/8/8/8/8 w - - 0 1" -d tablebases
+
+Building a table needs the tables its captures and promotions lead to (KPK needs KQK and KRK),
+build makes those first when they aren't in the directory yet. Four piece tables work the same way but hold 64 times as many
+positions, building one in Python takes a long time and a few gigabytes of memory.
+En passant isn't in the tables, so a table with pawns on both sides can't be built; in the
+others an en passant square never matters.
+'''
+import argparse
+import itertools
+import mmap
+import os
+import sys
+
+import ChessEngine
+from ChessEngine import EMPTY, WK, BK, WP, BP, CAPTURED_SHIFT, PROMOTION_SHIFT
+
+DRAW, WIN, LOSS = 0, 1, -1
+LOSS_BIT = 128
+MAX_PLIES = 127
+
+pieceLetters = 'PNBRQK' #letter of each piece type, piece number = type + 6 for black
+pieceValues = (1, 3, 3, 5, 9, 0)
+insufficientMaterial = ('KK', 'KNK', 'KBK') #draws whatever happens, no table needed
+
+#white king squares of a pawnless table: a1-d1-d4 triangle, row 7 is the first rank
+triangle = [r * 8 + c for r in range(7, 3, -1) for c in range(4) if 7 - r <= c]
+triangleIndex = {sq: i for i, sq in enumerate(triangle)}
+#white king squares of a table with pawns: files a-d
+leftHalf = [r * 8 + c for r in range(8) for c in range(4)]
+leftHalfIndex = {sq: i for i, sq in enumerate(leftHalf)}
+
+
+def _sortKey(entry):
+    piece, sq = entry
+    return (piece // 6, 5 - piece % 6, sq) #white first, then K Q R B N P, then by square
+
+'''
+(signature, squares in signature order, whiteToMove) of a list of (piece, square), with the colours
+swapped and the board mirrored top to bottom when black has the stronger pieces
+'''
+def canonical(entries, whiteToMove):
+    white = [piece for piece, _ in entries if piece < 6]
+    black = [piece - 6 for piece, _ in entries if piece >= 6]
+    whiteStrength = (sum(pieceValues[p] for p in white), sorted(white))
+    blackStrength = (sum(pieceValues[p] for p in black), sorted(black))
+    if whiteStrength < blackStrength:
+        entries = [((piece + 6) % 12, sq ^ 56) for piece, sq in entries]
+        whiteToMove = not whiteToMove
+    entries = sorted(entries, key=_sortKey)
+    signature = ''.join(pieceLetters[piece % 6] for piece, _ in entries)
+    return signature, [sq for _, sq in entries], whiteToMove
+
+'''
+White and black pieces of a signature as piece numbers, in signature order
+'''
+def signaturePieces(signature):
+    blackKing = signature.index('K', 1)
+    return ([pieceLetters.index(letter) for letter in signature[:blackKing]] +
+            [pieceLetters.index(letter) + 6 for letter in signature[blackKing:]])
+
+def encode(result, plies):
+    if result == DRAW:
+        return 0
+    return plies if result == WIN else LOSS_BIT | plies
+
+def decode(value):
+    if value == 0:
+        return DRAW, 0
+    return (LOSS, value & ~LOSS_BIT) if value & LOSS_BIT else (WIN, value)
+
+
+class Table():
+    def __init__(self, signature, data=None):
+        self.signature = signature
+        self.pieces = signaturePieces(signature)
+        self.hasPawns = WP in self.pieces or BP in self.pieces
+        self.kingSquares = leftHalf if self.hasPawns else triangle
+        self.kingIndex = leftHalfIndex if self.hasPawns else triangleIndex
+        self.sideSize = len(self.kingSquares) * 64 ** (len(self.pieces) - 1)
+        self.data = data #bytes-like of 2 * sideSize values, black to move in the second half
+
+    '''
+    Index of the position, squares in signature order
+    '''
+    def index(self, squares, whiteToMove):
+        king = squares[0]
+        if king & 7 > 3: #mirror left to right
+            squares = [sq ^ 7 for sq in squares]
+            king ^= 7
+        if not self.hasPawns:
+            if king < 32: #mirror top to bottom
+                squares = [sq ^ 56 for sq in squares]
+                king ^= 56
+            if 7 - (king >> 3) > (king & 7): #mirror in the a1-h8 diagonal
+                squares = [(7 - (sq & 7)) * 8 + 7 - (sq >> 3) for sq in squares]
+                king = squares[0]
+        index = self.kingIndex[king]
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index if whiteToMove else index + self.sideSize
+
+    def probe(self, squares, whiteToMove):
+        return decode(self.data[self.index(squares, whiteToMove)])
+
+
+class Tablebases():
+    def __init__(self, directory='tablebases'):
+        self.directory = directory
+        self.tables = {}
+        self.files = []
+        self.maxPieces = 0
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.tb'):
+                    self.load(name[:-3], os.path.join(directory, name))
+
+    def load(self, signature, path):
+        f = open(path, 'rb')
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.files.append((f, data))
+        self.add(Table(signature, data))
+
+    def add(self, table):
+        self.tables[table.signature] = table
+        self.maxPieces = max(self.maxPieces, len(table.pieces))
+
+    def close(self):
+        for f, data in self.files:
+            data.close()
+            f.close()
+        self.files = []
+        self.tables = {}
+        self.maxPieces = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    '''
+    (result, plies) of a position given as a list of (piece, square), None without a table for it
+    '''
+    def probeEntries(self, entries, whiteToMove):
+        signature, squares, whiteToMove = canonical(entries, whiteToMove)
+        if signature in insufficientMaterial:
+            return DRAW, 0
+        table = self.tables.get(signature)
+        if table is None:
+            return None
+        return table.probe(squares, whiteToMove)
+
+    '''
+    (result, plies) for the side to move in gs: WIN, DRAW or LOSS and the plies to mate,
+    None when there is no table for the position
+    '''
+    def probe(self, gs):
+        occupied = gs.occupied
+        if bin(occupied).count('1') > self.maxPieces:
+            return None
+        entries = []
+        squares = gs.squares
+        while occupied:
+            low = occupied & -occupied
+            sq = low.bit_length() - 1
+            entries.append((squares[sq], sq))
+            occupied ^= low
+        return self.probeEntries(entries, gs.whiteToMove)
+
+    '''
+    (move, result, plies) of the best legal move in gs: the quickest mate when winning, the slowest when
+    losing, None when a position after one of the moves isn't in the tables. moves limits the choice
+    '''
+    def bestMove(self, gs, moves=None):
+        best = None
+        bestRank = None
+        for move in moves if moves is not None else gs.generateLegalMoves():
+            gs.makeMove(move)
+            value = self.probe(gs)
+            gs.undo()
+            if value is None:
+                return None
+            result, plies = -value[0], value[1] + (value[0] != DRAW)
+            rank = (result, -plies if result == WIN else plies) #win soonest, lose latest
+            if bestRank is None or rank > bestRank:
+                best, bestRank = (move, result, plies), rank
+        return best
+
+
+def _setPosition(gs, pieces, squares, whiteToMove):
+    bbs = [0]*12
+    board = [EMPTY]*64
+    for piece, sq in zip(pieces, squares):
+        bbs[piece] |= 1 << sq
+        board[sq] = piece
+        if piece == WK:
+            gs.whiteKingLocation = (sq >> 3, sq & 7)
+        elif piece == BK:
+            gs.blackKingLocation = (sq >> 3, sq & 7)
+    gs.bitboards = bbs
+    gs.squares = board
+    gs.updateOccupancy()
+    gs.whiteToMove = whiteToMove
+    gs.enpassantPossible = ()
+
+'''
+Work out every position of the signature's table by retrograde analysis: the mates are known,
+a position is won in d + 1 plies as soon as one move reaches a position lost in d, and lost in
+d + 1 once all its moves reach positions won, the longest in d. Positions are settled in order of
+distance, so every distance is the shortest (longest for the losing side) possible. Captures and
+promotions that leave the table are looked up in tablebases
+'''
+def generateTable(signature, tablebases):
+    table = Table(signature)
+    pieces = table.pieces
+    if WP in pieces and BP in pieces:
+        raise ValueError(f'{signature}: pawns on both sides need en passant in the table')
+    if canonical(list(zip(pieces, range(len(pieces)))), True)[0] != signature:
+        raise ValueError(f'{signature}: the stronger side has to come first')
+    size = 2 * table.sideSize
+    values = bytearray(size)
+    successorCount = [0]*size
+    predecessors = [[] for _ in range(size)]
+    events = [[] for _ in range(MAX_PLIES + 2)] #events[d]: (child lost?, parents) of the positions settled at distance d
+    gs = ChessEngine.GameState()
+    for whiteToMove in (True, False):
+        for king in table.kingSquares:
+            for others in itertools.product(range(64), repeat=len(pieces) - 1):
+                squares = (king,) + others
+                if len(set(squares)) < len(squares):
+                    continue
+                if any(piece in (WP, BP) and not 8 <= sq < 56 for piece, sq in zip(pieces, squares)):
+                    continue
+                index = table.index(squares, whiteToMove)
+                _setPosition(gs, pieces, squares, whiteToMove)
+                enemyKing = gs.bitboards[BK if whiteToMove else WK]
+                if gs.attackedSquares(whiteToMove) & enemyKing: #the side to move could take the king
+                    continue
+                moves = gs.generateLegalMoves()
+                if not moves:
+                    if gs.inCheck:
+                        values[index] = encode(LOSS, 0)
+                        events[0].append((True, predecessors[index]))
+                    continue
+                successorCount[index] = len(moves)
+                for move in moves:
+                    start = move & 63
+                    end = (move >> 6) & 63
+                    captured = (move >> CAPTURED_SHIFT) & 15
+                    promotion = (move >> PROMOTION_SHIFT) & 7
+                    entries = []
+                    for piece, sq in zip(pieces, squares):
+                        if sq == start:
+                            entries.append((promotion + 6 * (piece // 6) if promotion else piece, end))
+                        elif sq != end or captured == EMPTY:
+                            entries.append((piece, sq))
+                    if captured == EMPTY and not promotion:
+                        _, childSquares, childWhiteToMove = canonical(entries, not whiteToMove)
+                        child = table.index(childSquares, childWhiteToMove)
+                        predecessors[child].append(index)
+                        continue
+                    value = tablebases.probeEntries(entries, not whiteToMove)
+                    if value is None:
+                        raise ValueError(f'{signature} needs the table for {canonical(entries, True)[0]}')
+                    if value[0] != DRAW:
+                        events[value[1]].append((value[0] == LOSS, (index,)))
+    for distance in range(MAX_PLIES):
+        for childLost, parents in events[distance]:
+            for parent in parents:
+                if values[parent]: #already settled at a shorter distance
+                    continue
+                if childLost:
+                    values[parent] = encode(WIN, distance + 1)
+                    events[distance + 1].append((False, predecessors[parent]))
+                else:
+                    successorCount[parent] -= 1
+                    if not successorCount[parent]:
+                        values[parent] = encode(LOSS, distance + 1)
+                        events[distance + 1].append((True, predecessors[parent]))
+        events[distance] = None
+    if any(events[MAX_PLIES]):
+        raise ValueError(f'{signature}: mates longer than {MAX_PLIES} plies don\'t fit in a byte')
+    table.data = values
+    return table
+
+'''
+Signatures of the tables a table's captures and promotions lead to, without the drawn ones
+'''
+def dependencies(signature):
+    pieces = signaturePieces(signature)
+    found = set()
+    for i, piece in enumerate(pieces):
+        if piece == WK or piece == BK:
+            continue
+        others = pieces[:i] + pieces[i + 1:]
+        found.add(canonical(list(zip(others, range(len(others)))), True)[0]) #the piece is captured
+        if piece == WP or piece == BP:
+            for promotion in range(1, 5):
+                promoted = pieces[:i] + [promotion + 6 * (piece // 6)] + pieces[i + 1:]
+                found.add(canonical(list(zip(promoted, range(len(promoted)))), True)[0])
+    return sorted(found - set(insufficientMaterial))
+
+'''
+Generate the tables, each after the tables it depends on (which are built too when they aren't in
+directory yet), and write them to directory as <signature>.tb
+'''
+def buildTablebases(signatures, directory='tablebases', out=sys.stdout):
+    os.makedirs(directory, exist_ok=True)
+    tablebases = Tablebases(directory)
+    order = []
+    def visit(signature):
+        if signature in order:
+            return
+        for dependency in dependencies(signature):
+            if dependency in signatures or dependency not in tablebases.tables:
+                visit(dependency)
+        order.append(signature)
+    for signature in signatures:
+        visit(signature)
+    for signature in order:
+        table = generateTable(signature, tablebases)
+        with open(os.path.join(directory, signature + '.tb'), 'wb') as f:
+            f.write(table.data)
+        tablebases.add(table)
+        wins = sum(1 for value in table.data if value and not value & LOSS_BIT)
+        longest = max((value & ~LOSS_BIT for value in table.data), default=0)
+        print(f'{signature}: {len(table.data)} bytes, {wins} wins for the side to move, '
+              f'longest mate {longest} plies', file=out, flush=True)
+    return tablebases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or probe endgame tablebases')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='generate tables by retrograde analysis')
+    build.add_argument('signatures', nargs='*', default=['KQK', 'KRK', 'KPK'])
+    build.add_argument('-d', '--directory', default='tablebases')
+    probe = commands.add_parser('probe', help='result and best move of a position')
+    probe.add_argument('--fen', required=True)
+    probe.add_argument('-d', '--directory', default='tablebases')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        buildTablebases(args.signatures, args.directory).close()
+        return 0
+    gs = ChessEngine.GameState(args.fen)
+    with Tablebases(args.directory) as tablebases:
+        value = tablebases.probe(gs)
+        if value is None:
+            print('not in the tablebases')
+            return 1
+        result, plies = value
+        print({WIN: f'win, mate in {plies} plies', DRAW: 'draw', LOSS: f'loss, mated in {plies} plies'}[result])
+        best = tablebases.bestMove(gs)
+        if best is not None:
+            print(f'best move {ChessEngine.moveNotation(best[0])}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
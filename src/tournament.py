@@ -0,0 +1,202 @@
+'''
+Headless self-play: plays N games between two engines on GameState directly (no pygame), spread
+over a process pool. Every game is appended to the PGN file as soon as it finishes, with the time
+and nodes of each move as comments, and the run ends with games per second, the first engine's Elo
+difference with a 95% error margin and the time spent per game phase.
+
+    python tournament.py --games 100 --engine1 minimax:time=0.1 --engine2 random --workers 8
+
+Engines are given as name:option=value,...
+    random                  a random legal move (randomAI.findRandomMove)
+    minimax:time=T,depth=D  the alpha-beta Searcher with T seconds and/or D plies per move
+Colours alternate, engine1 has white in the even numbered games. Games end drawn by threefold
+repetition and the fifty-move rule, games still going after --max-moves full moves are adjudicated a draw.
+'''
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import ChessEngine
+import notation
+import randomAI
+from minimax import Searcher
+from moveCache import MoveCache
+
+phases = ('opening', 'middlegame', 'endgame')
+
+
+class RandomEngine():
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    '''
+    Returns (move, nodes searched)
+    '''
+    def chooseMove(self, gs):
+        return randomAI.findRandomMove(gs.generateLegalMoves(), self.rng), 0
+
+
+class SearchEngine():
+    def __init__(self, timeLimit=None, depth=64, hashMegabytes=16):
+        self.timeLimit = timeLimit
+        self.depth = depth
+        self.searcher = Searcher(hashMegabytes)
+
+    def chooseMove(self, gs):
+        result = self.searcher.search(gs, self.timeLimit, self.depth)
+        return result.bestMove, result.nodes + result.qnodes
+
+
+'''
+Build an engine from its description, e.g. 'random' or 'minimax:time=0.5,depth=6'
+'''
+def makeEngine(spec, seed=None):
+    name, _, options = spec.partition(':')
+    settings = dict(option.split('=') for option in options.split(',') if option)
+    if name == 'random':
+        return RandomEngine(seed)
+    if name == 'minimax':
+        timeLimit = float(settings['time']) if 'time' in settings else None
+        depth = int(settings.get('depth', 64 if timeLimit is not None else 3))
+        return SearchEngine(timeLimit, depth, int(settings.get('hash', 16)))
+    raise ValueError(f'unknown engine {spec!r}')
+
+
+'''
+Opening for the first 10 full moves, endgame once no more than 6 knights, bishops, rooks and queens are left
+'''
+def gamePhase(gs):
+    if len(gs.movelog) < 20:
+        return 'opening'
+    bbs = gs.bitboards
+    pieces = 0
+    for piece in (ChessEngine.WN, ChessEngine.WB, ChessEngine.WR, ChessEngine.WQ,
+                  ChessEngine.BN, ChessEngine.BB, ChessEngine.BR, ChessEngine.BQ):
+        pieces += bin(bbs[piece]).count('1')
+    return 'endgame' if pieces <= 6 else 'middlegame'
+
+
+'''
+Play one game in a worker process, returns a dict with the result, the moves in SAN and (seconds, nodes, phase) for every move
+'''
+def playGame(index, whiteSpec, blackSpec, maxMoves, seed):
+    engines = (makeEngine(whiteSpec, seed * 2), makeEngine(blackSpec, seed * 2 + 1))
+    gs = ChessEngine.GameState()
+    gs.moveCache = MoveCache() #the engines search this GameState, later iterations and moves revisit positions
+    moves = []
+    moveStats = []
+    result, termination = '1/2-1/2', 'adjudication'
+    while len(moves) < 2 * maxMoves:
+        if not gs.generateLegalMoves():
+            if gs.inCheck:
+                result = '0-1' if gs.whiteToMove else '1-0'
+            termination = 'checkmate' if gs.inCheck else 'stalemate'
+            break
+        reason = gs.drawReason()
+        if reason is not None:
+            termination = reason
+            break
+        phase = gamePhase(gs)
+        start = time.perf_counter()
+        move, nodes = engines[0 if gs.whiteToMove else 1].chooseMove(gs)
+        moveStats.append((time.perf_counter() - start, nodes, phase))
+        moves.append(notation.moveToSan(gs, move))
+        gs.makeMove(move)
+    return {'index': index, 'white': whiteSpec, 'black': blackSpec, 'result': result,
+            'termination': termination, 'moves': moves, 'moveStats': moveStats}
+
+def _playGame(args):
+    return playGame(*args)
+
+
+'''
+PGN text of a finished game, the time and nodes of each move go in a comment after it
+'''
+def gameToPgn(game):
+    tags = {'Event': 'Self-play', 'Round': str(game['index'] + 1), 'White': game['white'], 'Black': game['black'],
+            'Termination': 'adjudication' if game['termination'] == 'adjudication' else 'normal'}
+    comments = [f'{seconds:.3f}s {nodes} nodes' for seconds, nodes, _ in game['moveStats']]
+    if comments:
+        comments[-1] += f', {game["termination"]}'
+    return notation.formatPgn(tags, game['moves'], game['result'], comments)
+
+
+'''
+Elo difference for a score of wins, losses and draws, and the half width of its 95% interval. The
+interval is the Wilson interval of the score, which stays wide for small samples and extreme scores;
+once it reaches a score of 0 or 1 the Elo margin is unbounded (inf)
+'''
+def eloEstimate(wins, losses, draws):
+    games = wins + losses + draws
+    if games == 0:
+        return 0.0, float('inf')
+    score = (wins + draws / 2) / games
+    z = 1.96
+    centre = (score + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(score * (1 - score) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    def elo(s):
+        s = min(max(s, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / s - 1)
+    if centre - half <= 1e-9 or centre + half >= 1 - 1e-9:
+        return elo(score), float('inf')
+    return elo(score), (elo(centre + half) - elo(centre - half)) / 2
+
+
+def runTournament(games, engine1, engine2, workers=None, maxMoves=200, pgnPath='tournament.pgn', seed=0, out=sys.stdout):
+    jobs = []
+    for i in range(games):
+        white, black = (engine1, engine2) if i % 2 == 0 else (engine2, engine1)
+        jobs.append((i, white, black, maxMoves, seed * games + i))
+    wins = losses = draws = 0
+    phaseTotals = {phase: [0, 0.0, 0] for phase in phases} #moves, seconds, nodes
+    start = time.perf_counter()
+    with open(pgnPath, 'w') as pgn, multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        for game in pool.imap_unordered(_playGame, jobs):
+            pgn.write(gameToPgn(game))
+            pgn.flush()
+            engine1White = game['index'] % 2 == 0
+            if game['result'] == '1/2-1/2':
+                draws += 1
+            elif (game['result'] == '1-0') == engine1White:
+                wins += 1
+            else:
+                losses += 1
+            for seconds, nodes, phase in game['moveStats']:
+                totals = phaseTotals[phase]
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] += nodes
+            print(f'game {game["index"] + 1:4}: {game["white"]} - {game["black"]} {game["result"]:7} '
+                  f'({game["termination"]}, {len(game["moves"])} plies)', file=out, flush=True)
+    elapsed = time.perf_counter() - start
+    elo, margin = eloEstimate(wins, losses, draws)
+    print(f'{games} games in {elapsed:.1f}s ({games / max(elapsed, 1e-9):.2f} games/s)', file=out)
+    print(f'{engine1} vs {engine2}: +{wins} -{losses} ={draws}, Elo {elo:+.1f} +/- {margin:.1f}', file=out)
+    for phase in phases:
+        moves, seconds, nodes = phaseTotals[phase]
+        if moves:
+            print(f'{phase:10} {moves:6} moves {seconds:8.2f}s {seconds / moves * 1000:8.1f} ms/move'
+                  f' {nodes / max(seconds, 1e-9):9.0f} nps', file=out)
+    return wins, losses, draws
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless self-play tournament between two engines')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--engine1', default='minimax:time=0.1')
+    parser.add_argument('--engine2', default='random')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--max-moves', type=int, default=200, help='full moves before a game is adjudicated a draw')
+    parser.add_argument('--pgn', default='tournament.pgn', help='file the games are written to as they finish')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    runTournament(args.games, args.engine1, args.engine2, args.workers, args.max_moves, args.pgn, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+'''
+Fixed size transposition table for the search. Entries live in two preallocated arrays of
+64 bit integers (the full position key and one packed data word), so the memory used is set
+by the megabyte budget and never grows however long the search runs.
+
+Data word layout:
+    bits  0-19  score + SCORE_OFFSET
+    bits 20-35  best move (from square | to square << 6 | promotion << 12), 0 for none
+    bits 36-43  depth
+    bits 44-45  bound type (EXACT, LOWER, UPPER)
+    bits 46-53  age (search number the entry was written in)
+    bit  54     always set, so an empty slot is the only data word equal to 0
+
+Entries are grouped in buckets of two: the first slot keeps the deepest entry (it is only
+replaced by an equal or deeper search, or once it is from an older search) and the second
+slot always takes the newest entry.
+'''
+from array import array
+
+EXACT = 0 #score is exact
+LOWER = 1 #score failed high, the real score is at least this
+UPPER = 2 #score failed low, the real score is at most this
+
+ENTRY_BYTES = 16
+SCORE_OFFSET = 1 << 19
+
+
+class TranspositionTable():
+    def __init__(self, megabytes=16):
+        self.resize(megabytes)
+
+    def resize(self, megabytes):
+        entries = max(2, int(megabytes * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1) #power of two so the index is a mask
+        self.bucketMask = buckets - 1
+        self.size = buckets * 2
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+
+    '''
+    Called at the start of every search so entries from older searches can be replaced first
+    '''
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xff
+
+    '''
+    Returns (depth, score, bound, move) for the position, or None if it isn't stored
+    '''
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self.bucketMask) << 1
+        keys = self.keys
+        if keys[index] == key:
+            data = self.data[index]
+        elif keys[index + 1] == key:
+            data = self.data[index + 1]
+        else:
+            return None
+        if data == 0: #empty slot that happened to match a zero key
+            return None
+        self.hits += 1
+        return ((data >> 36) & 0xff, (data & 0xfffff) - SCORE_OFFSET, (data >> 44) & 3, (data >> 20) & 0xffff)
+
+    def store(self, key, depth, score, bound, move):
+        self.stores += 1
+        index = (key & self.bucketMask) << 1
+        keys = self.keys
+        data = self.data
+        entry = (score + SCORE_OFFSET) | (move << 20) | (depth << 36) | (bound << 44) | (self.age << 46) | 1 << 54 #bit 54 marks the slot used
+        old = data[index]
+        if keys[index] == key:
+            if old != 0 and (old >> 46) & 0xff == self.age and depth < (old >> 36) & 0xff:
+                if move != 0: #shallower result of this search: keep the deeper score, only take the move
+                    data[index] = (old & ~(0xffff << 20)) | (move << 20)
+                return
+            if move == 0: #keep the old best move if this search didn't find one
+                entry |= old & (0xffff << 20)
+            data[index] = entry
+            return
+        if old == 0 or (old >> 46) & 0xff != self.age or depth >= (old >> 36) & 0xff:
+            #depth preferred slot: move its entry down to the always replace slot
+            if old != 0:
+                keys[index + 1] = keys[index]
+                data[index + 1] = old
+            keys[index] = key
+            data[index] = entry
+        else:
+            if keys[index + 1] == key and move == 0:
+                entry |= data[index + 1] & (0xffff << 20)
+            keys[index + 1] = key
+            data[index + 1] = entry
+
+    '''
+    Permille of the first 1000 slots that were written in the current search
+    '''
+    def hashfull(self):
+        sample = min(1000, self.size)
+        used = sum(1 for i in range(sample) if self.data[i] != 0 and (self.data[i] >> 46) & 0xff == self.age)
+        return used * 1000 // sample
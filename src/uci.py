@@ -0,0 +1,283 @@
+'''
+Universal Chess Interface server: speaks UCI on stdin/stdout so GUIs, tournament managers and
+analysis farms can drive the engine. One process serves any number of moves and games, and the
+Searcher (transposition table, history), the legal move cache, the opening book and the
+tablebases are loaded once and stay warm between them; ucinewgame keeps the hash, old entries
+age out as new searches overwrite them.
+
+    python uci.py [--hash 64] [--book book.bin] [--tablebases tablebases]
+
+Supported: uci, debug, isready, setoption (Hash, Book, Tablebases), ucinewgame,
+position startpos|fen ... [moves ...], go [wtime btime winc binc movestogo movetime depth
+infinite ponder searchmoves ...], ponderhit, stop, quit. The search runs on its own thread so
+stop is answered straight away, and every finished depth is reported with an info line. Under
+go infinite and go ponder the bestmove line waits for stop (or ponderhit) even when the search ends first.
+The engine doesn't castle, so after a castling move (or any move it can't play) in a position
+command it no longer knows the game's position and answers go with bestmove 0000 until a
+position command it can follow.
+'''
+import argparse
+import sys
+import threading
+import time
+
+import ChessEngine
+import notation
+from minimax import Searcher, CHECKMATE, MAX_PLY
+from moveCache import MoveCache
+from openingBook import OpeningBook
+from tablebase import Tablebases
+
+ENGINE_NAME = 'Chess'
+ENGINE_AUTHOR = 'the Chess authors'
+MOVE_OVERHEAD = 0.05 #seconds kept back from every move for the GUI and the pipe
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining time is shared between when the GUI doesn't say
+goValues = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes', 'mate') #go options with a number
+goFlags = ('infinite', 'ponder')
+
+
+'''
+Seconds to think for a move: movetime as given, otherwise a share of the remaining clock plus
+most of the increment, never more than half of what is left. None means no limit
+'''
+def moveTime(whiteToMove, options):
+    if 'movetime' in options:
+        return max(options['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+    remaining = options.get('wtime' if whiteToMove else 'btime')
+    if remaining is None:
+        return None
+    increment = options.get('winc' if whiteToMove else 'binc', 0)
+    movesToGo = options.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = remaining / movesToGo + increment * 0.8
+    return max(min(budget, remaining / 2) / 1000 - MOVE_OVERHEAD, 0.01)
+
+'''
+UCI score field of a search score: 'cp 35' or 'mate 3' (negative when the engine is mated)
+'''
+def scoreField(score):
+    if abs(score) >= CHECKMATE - MAX_PLY:
+        plies = CHECKMATE - abs(score)
+        return f'mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}'
+    return f'cp {score}'
+
+
+class UciServer():
+    def __init__(self, out=sys.stdout, hashMegabytes=16, bookPath=None, tablebasePath=None):
+        self.out = out
+        self.outLock = threading.Lock() #the search thread writes info and bestmove lines too
+        self.searcher = Searcher(hashMegabytes)
+        self.gs = ChessEngine.GameState()
+        self.gs.moveCache = MoveCache()
+        self.thread = None
+        self.infinite = False #go infinite: no time limit and no bestmove before stop
+        self.positionFen = None #fen of the last position command, None for startpos
+        self.desynced = False #the last position command had a move that couldn't be played
+        self.ponderTime = None #seconds the search gets from ponderhit on, while pondering
+        self.release = threading.Event() #set when the search thread may send its bestmove line
+        self.debug = False
+        if bookPath:
+            self.setOption('Book', bookPath)
+        if tablebasePath:
+            self.setOption('Tablebases', tablebasePath)
+
+    def send(self, line):
+        with self.outLock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    '''
+    Handle one command line, returns False on quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send('option name Hash type spin default 16 min 1 max 4096')
+            self.send('option name Book type string default <empty>')
+            self.send('option name Tablebases type string default <empty>')
+            self.send('uciok')
+        elif command == 'debug':
+            self.debug = args[:1] == ['on']
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.stopSearch()
+            text = ' '.join(args)
+            name, _, value = text.partition(' value ')
+            self.setOption(name.replace('name', '', 1).strip(), value.strip())
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.gs.moveCache.clear()
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == 'go':
+            self.stopSearch()
+            self.go(args)
+        elif command == 'ponderhit':
+            if self.ponderTime is not None: #the expected move was played, the search goes on as a normal one
+                self.searcher.deadline = time.perf_counter() + self.ponderTime
+            self.ponderTime = None
+            if not self.infinite:
+                self.release.set()
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'quit':
+            self.stopSearch()
+            return False
+        elif self.debug:
+            self.send(f'info string unknown command {command}')
+        return True
+
+    '''
+    Set an engine option, a value that can't be used (not a number, a file that can't be read) is
+    reported with an info string and the option stays as it was
+    '''
+    def setOption(self, name, value):
+        try:
+            self.applyOption(name, value)
+        except (OSError, ValueError) as error:
+            self.send(f'info string option {name} not set: {error}')
+
+    def applyOption(self, name, value):
+        if name.lower() == 'hash':
+            self.searcher.tt.resize(max(1, int(value)))
+        elif name.lower() == 'book':
+            book = OpeningBook(value) if value and value != '<empty>' else None #opened first, so a bad path keeps the old book
+            if self.searcher.book is not None:
+                self.searcher.book.close()
+            self.searcher.book = book
+        elif name.lower() == 'tablebases':
+            tablebases = Tablebases(value) if value and value != '<empty>' else None
+            if self.searcher.tablebases is not None:
+                self.searcher.tablebases.close()
+            self.searcher.tablebases = tablebases
+        else:
+            self.send(f'info string unknown option {name}')
+
+    '''
+    position startpos|fen <fen> [moves m1 m2 ...]. When the new position is the current one with
+    more moves played (the usual case during a game) only the new moves are made
+    '''
+    def setPosition(self, args):
+        if 'moves' in args:
+            split = args.index('moves')
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup[:1] == ['fen']:
+            fen = ' '.join(setup[1:])
+        else:
+            fen = None
+        gs = self.gs
+        self.desynced = False
+        played = [ChessEngine.moveNotation(move) for move in gs.movelog]
+        if fen != self.positionFen or moves[:len(played)] != played:
+            gs.loadFen(fen if fen is not None else notation.startFen)
+            self.positionFen = fen
+            played = []
+        for text in moves[len(played):]:
+            for move in gs.generateLegalMoves():
+                if ChessEngine.moveNotation(move) == text:
+                    gs.makeMove(move)
+                    break
+            else:
+                self.send(f'info string illegal move {text}, not searching this position')
+                self.desynced = True
+                break
+
+    def go(self, args):
+        if self.desynced: #the board isn't the game's position, a move for it would be for the wrong game
+            self.send('bestmove 0000')
+            return
+        options = {}
+        searchMoves = None
+        i = 0
+        while i < len(args):
+            name = args[i]
+            if name in goValues:
+                try:
+                    options[name] = int(args[i + 1]) #nodes and mate are read but not used
+                    i += 2
+                except (IndexError, ValueError):
+                    self.send(f'info string go {name} needs a number, ignoring it')
+                    i += 1
+            elif name == 'searchmoves':
+                searchMoves = []
+                i += 1
+                while i < len(args) and args[i] not in goValues and args[i] not in goFlags:
+                    searchMoves.append(args[i])
+                    i += 1
+            else:
+                options[name] = True
+                i += 1
+        timeLimit = moveTime(self.gs.whiteToMove, options)
+        self.ponderTime = None
+        if 'ponder' in options: #no limit until ponderhit or stop
+            self.ponderTime, timeLimit = timeLimit, None
+        self.infinite = 'infinite' in options
+        if self.infinite:
+            timeLimit = None
+        self.release = threading.Event()
+        if not self.infinite and 'ponder' not in options:
+            self.release.set()
+        maxDepth = options.get('depth', 64)
+        rootMoves = None
+        if searchMoves is not None:
+            rootMoves = [move for move in self.gs.generateLegalMoves() if ChessEngine.moveNotation(move) in searchMoves]
+        self.thread = threading.Thread(target=self.run, args=(timeLimit, maxDepth, rootMoves), daemon=True)
+        self.thread.start()
+
+    def run(self, timeLimit, maxDepth, rootMoves):
+        result = self.searcher.search(self.gs, timeLimit, maxDepth, self.info, rootMoves)
+        self.release.wait() #infinite and ponder searches only answer once the GUI asks
+        if result.fromBook or result.fromTablebase:
+            self.send(f'info depth 0 score {scoreField(result.score)} pv {ChessEngine.moveNotation(result.bestMove)}')
+        if result.bestMove is None:
+            self.send('bestmove 0000')
+        elif len(result.pv) > 1:
+            self.send(f'bestmove {ChessEngine.moveNotation(result.bestMove)} ponder {ChessEngine.moveNotation(result.pv[1])}')
+        else:
+            self.send(f'bestmove {ChessEngine.moveNotation(result.bestMove)}')
+
+    '''
+    Info line of a finished iteration
+    '''
+    def info(self, result):
+        nodes = result.nodes + result.qnodes
+        milliseconds = int(result.time * 1000)
+        self.send(f'info depth {result.depth} score {scoreField(result.score)} nodes {nodes} '
+                  f'nps {int(nodes / result.time) if result.time else 0} time {milliseconds} '
+                  f'hashfull {self.searcher.tt.hashfull()} pv {" ".join(ChessEngine.moveNotation(m) for m in result.pv)}')
+
+    '''
+    Stop a running search and wait for its bestmove line
+    '''
+    def stopSearch(self):
+        if self.thread is not None:
+            self.release.set()
+            while self.thread.is_alive(): #stop again in case the search hadn't started when it was first asked
+                self.searcher.stop()
+                self.thread.join(0.01)
+            self.thread = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='UCI engine on stdin/stdout')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table megabytes')
+    parser.add_argument('--book', default=None, help='opening book made by openingBook.py')
+    parser.add_argument('--tablebases', default=None, help='directory of tables made by tablebase.py')
+    args = parser.parse_args(argv)
+    server = UciServer(sys.stdout, args.hash, args.book, args.tablebases)
+    for line in sys.stdin:
+        if not server.handle(line):
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())